@@ -0,0 +1,71 @@
+import argparse
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# local stand-in for the Azure text-to-speech endpoint: every POST gets fake mp3 bytes,
+# streamed in chunks after a fixed synthesis delay. Point TTS_URL at it.
+#
+#   python -m benchmarks.fake_tts --port 8765 --latency 0.05
+
+CHUNK_SIZE = 4096
+
+
+class FakeTTSHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with self.server.lock:
+            self.server.requests += 1
+        time.sleep(self.server.latency)
+
+        size = self.server.audio_bytes
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/mpeg")
+        self.send_header("Content-Length", str(size))
+        self.end_headers()
+        for offset in range(0, size, CHUNK_SIZE):
+            self.wfile.write(b"\xff" * min(CHUNK_SIZE, size - offset))
+            time.sleep(self.server.chunk_delay)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeTTSServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, latency: float = 0.05, audio_bytes: int = 32000,
+                 chunk_delay: float = 0.0):
+        super().__init__(("127.0.0.1", port), FakeTTSHandler)
+        self.latency = latency
+        self.audio_bytes = audio_bytes
+        self.chunk_delay = chunk_delay
+        # POSTs received so far
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/cognitiveservices/v1"
+
+
+# start a server in a daemon thread; port 0 picks a free one
+def start(port: int = 0, latency: float = 0.05, audio_bytes: int = 32000, chunk_delay: float = 0.0):
+    server = FakeTTSServer(port, latency, audio_bytes, chunk_delay)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake text-to-speech server for benchmarks.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds before the first byte")
+    parser.add_argument("--audio-bytes", type=int, default=32000)
+    parser.add_argument("--chunk-delay", type=float, default=0.0, help="seconds between chunks")
+    args = parser.parse_args()
+
+    server = FakeTTSServer(args.port, args.latency, args.audio_bytes, args.chunk_delay)
+    print(f"Fake TTS listening on {server.url}")
+    server.serve_forever()
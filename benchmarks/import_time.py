@@ -0,0 +1,74 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+# import-time budget for the app: imports endpoints in fresh interpreters with
+# `python -X importtime`, reports the best of --repeat runs and the slowest modules, and
+# fails when the import is over --budget-ms or pulls in a module that should load lazily.
+#
+#   python -m benchmarks.import_time --budget-ms 1000
+
+# loaded on first use only: the chatbot's ML stack, the TF-IDF classifier, audio playback
+LAZY_MODULES = ["NpcTrainerAI", "numpy", "torch", "tensorflow", "nltk", "pydub", "requests"]
+
+parser = argparse.ArgumentParser(description="Measure and check the import time of the app.")
+parser.add_argument("--module", default="endpoints")
+parser.add_argument("--budget-ms", type=float, default=1000.0)
+parser.add_argument("--repeat", type=int, default=5)
+parser.add_argument("--top", type=int, default=15, help="slowest modules to report")
+parser.add_argument("--json", action="store_true", help="print the report as JSON")
+args = parser.parse_args()
+
+
+# {module: (self microseconds, cumulative microseconds)} of one fresh import
+def measure(env: dict):
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {args.module}"],
+                            env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        sys.exit(result.stderr)
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = (int(own), int(cumulative))
+    return modules
+
+
+with tempfile.TemporaryDirectory() as directory:
+    env = dict(os.environ)
+    # engines connect lazily, but the URL must parse
+    env.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(directory, 'import_time.db')}")
+    runs = [measure(env) for _ in range(args.repeat)]
+
+best = min(runs, key=lambda modules: modules[args.module][1])
+total_ms = best[args.module][1] / 1000
+slowest = sorted(best.items(), key=lambda item: item[1][1], reverse=True)[:args.top]
+eager = sorted({name.split(".")[0] for name in best} & set(LAZY_MODULES))
+report = {
+    "module": args.module,
+    "import_ms": round(total_ms, 1),
+    "budget_ms": args.budget_ms,
+    "runs_ms": [round(modules[args.module][1] / 1000, 1) for modules in runs],
+    "modules_imported": len(best),
+    "eager_lazy_modules": eager,
+    "slowest": [{"module": name, "self_ms": round(own / 1000, 1), "cumulative_ms": round(cumulative / 1000, 1)}
+                for name, (own, cumulative) in slowest],
+}
+
+if args.json:
+    print(json.dumps(report, indent=2))
+else:
+    print(f"import {args.module}: {total_ms:.0f} ms (budget {args.budget_ms:.0f} ms, "
+          f"best of {args.repeat}), {len(best)} modules")
+    print(f"{'module':<50}{'self ms':>10}{'cumulative ms':>15}")
+    for item in report["slowest"]:
+        print(f"{item['module']:<50}{item['self_ms']:>10.1f}{item['cumulative_ms']:>15.1f}")
+    if eager:
+        print(f"imported eagerly, should load on first use: {', '.join(eager)}")
+
+if total_ms > args.budget_ms or eager:
+    sys.exit(1)
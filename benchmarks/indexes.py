@@ -0,0 +1,111 @@
+import argparse
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+# before/after benchmark of the index audit migration (0001 -> 0002): the same inserts and
+# join lookups against one SQLite database at each revision
+#
+#   python -m benchmarks.indexes --npcs 2000 --intents 20
+
+parser = argparse.ArgumentParser(description="Benchmark inserts and joins before and after the index audit.")
+parser.add_argument("--npcs", type=int, default=2000)
+parser.add_argument("--intents", type=int, default=20, help="intents per NPC")
+parser.add_argument("--texts", type=int, default=5, help="patterns and responses per intent")
+parser.add_argument("--lookups", type=int, default=2000)
+parser.add_argument("--repeat", type=int, default=5)
+args = parser.parse_args()
+
+directory = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(directory, 'unused.db')}")
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import MetaData, create_engine, insert, text
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BIO = "A wandering merchant who trades rumours for coin. " * 20
+AVATAR = "https://example.com/avatars/" + "a" * 200 + ".png"
+
+
+def migrated_engine(revision: str):
+    url = f"sqlite:///{os.path.join(directory, f'{revision}.db')}"
+    config = Config(os.path.join(ROOT, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(ROOT, "migrations"))
+    config.set_main_option("sqlalchemy.url", url)
+    command.upgrade(config, revision)
+    return create_engine(url)
+
+
+def timed(function):
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def insert_corpus(engine):
+    npc_rows, intent_rows, link_rows, pattern_rows, response_rows = [], [], [], [], []
+    for npc_id in range(1, args.npcs + 1):
+        npc_rows.append({"id": npc_id, "name": f"npc {npc_id}", "avatar": AVATAR, "bio": BIO,
+                         "voice": "en-AU-NatashaNeural", "style": "cheerful"})
+        for _ in range(args.intents):
+            intent_id = len(intent_rows) + 1
+            intent_rows.append({"id": intent_id, "tag": f"tag{intent_id}"})
+            link_rows.append({"npc_id": npc_id, "intent_id": intent_id})
+            for index in range(args.texts):
+                pattern_rows.append({"text": f"how do I get to the castle number {index} {intent_id}",
+                                     "intent_id": intent_id})
+                response_rows.append({"text": f"follow the river north, traveller {index} {intent_id}",
+                                      "intent_id": intent_id})
+
+    # the tables as the revision left them, not as database/models.py declares them today
+    tables = MetaData()
+    tables.reflect(bind=engine)
+    timings = {}
+    with engine.begin() as connection:
+        for table, rows in [("npcs", npc_rows), ("intents", intent_rows),
+                            ("npc_intents", link_rows), ("patterns", pattern_rows),
+                            ("responses", response_rows)]:
+            timings[f"insert {table}"] = timed(
+                lambda: connection.execute(insert(tables.tables[table]), rows))
+    return timings
+
+
+def lookup_queries(engine):
+    rng = random.Random(0)
+    intent_ids = [rng.randint(1, args.npcs * args.intents) for _ in range(args.lookups)]
+    npc_ids = [rng.randint(1, args.npcs) for _ in range(args.lookups)]
+    queries = {
+        # NPCs using an intent (model invalidation on every intent write)
+        "npcs of intent": (text("SELECT npc_id FROM npc_intents WHERE intent_id = :id"), intent_ids),
+        # an NPC's corpus: intents joined to their patterns
+        "npc corpus join": (text(
+            "SELECT p.text FROM npc_intents ni JOIN patterns p ON p.intent_id = ni.intent_id "
+            "WHERE ni.npc_id = :id"), npc_ids),
+        # one intent's patterns (tree loading)
+        "patterns of intent": (text("SELECT text FROM patterns WHERE intent_id = :id"), intent_ids),
+    }
+    timings = {}
+    with engine.connect() as connection:
+        for name, (statement, ids) in queries.items():
+            timings[name] = statistics.median(
+                timed(lambda: [connection.execute(statement, {"id": row_id}).all() for row_id in ids])
+                for _ in range(args.repeat))
+    return timings
+
+
+results = {}
+for revision in ("0001", "0002"):
+    engine = migrated_engine(revision)
+    results[revision] = {**insert_corpus(engine), **lookup_queries(engine)}
+    engine.dispose()
+
+print(f"{'operation':<22}{'before ms':>12}{'after ms':>12}{'speedup':>10}")
+for name in results["0001"]:
+    before, after = results["0001"][name], results["0002"][name]
+    print(f"{name:<22}{before * 1000:>12.1f}{after * 1000:>12.1f}{before / after:>9.1f}x")
+
+shutil.rmtree(directory)
@@ -0,0 +1,87 @@
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+
+# memory per worker process of one saved TF-IDF model, loaded into private memory versus
+# memory-mapped from the shared files. Each worker loads the model, scores a batch of
+# sentences so its pages are resident, and reports its memory from /proc (Linux only):
+# USS is what the process alone holds, PSS splits shared pages between their users.
+#
+#   python -m benchmarks.model_memory --patterns 200000 --workers 4
+
+parser = argparse.ArgumentParser(description="Compare worker memory of in-memory and mmapped models.")
+parser.add_argument("--patterns", type=int, default=200000)
+parser.add_argument("--patterns-per-intent", type=int, default=10)
+parser.add_argument("--workers", type=int, default=4)
+parser.add_argument("--vocabulary", type=int, default=20000, help="distinct words")
+
+
+def sentence(rng: random.Random, vocabulary: int):
+    return " ".join(f"w{rng.randrange(vocabulary)}" for _ in range(rng.randint(3, 9)))
+
+
+def rollup():
+    values = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                values[parts[0].rstrip(":")] = int(parts[1])
+    uss = values["Private_Clean"] + values["Private_Dirty"]
+    return uss / 1024, values["Pss"] / 1024
+
+
+def worker(path, mmap, vocabulary, ready, done, results):
+    from services import classifiers
+    before_uss, _ = rollup()
+    model = classifiers.TfidfClassifier.load(path, mmap=mmap)
+    rng = random.Random(os.getpid())
+    model.scores([sentence(rng, vocabulary) for _ in range(64)])
+    # touch every array page, as a long-running worker eventually does
+    for name in classifiers.ARRAYS:
+        getattr(model, name).sum()
+    ready.wait()
+    uss, pss = rollup()
+    results.put((uss - before_uss, pss))
+    done.wait()
+
+
+def measure(path, mmap, vocabulary, workers):
+    context = multiprocessing.get_context("spawn")
+    ready, done = context.Barrier(workers + 1), context.Event()
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(path, mmap, vocabulary, ready, done, results))
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    # every worker holds the model while the others measure, so shared pages are split
+    ready.wait()
+    measured = [results.get() for _ in processes]
+    done.set()
+    for process in processes:
+        process.join()
+    return measured
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    from services import classifiers
+
+    rng = random.Random(0)
+    intents = [{"id": index, "patterns": [sentence(rng, args.vocabulary)
+                                          for _ in range(args.patterns_per_intent)],
+                "responses": [f"response {index}"]}
+               for index in range(args.patterns // args.patterns_per_intent)]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "model")
+        classifiers.TfidfClassifier(intents).save(path)
+        size = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)) / 2 ** 20
+        print(f"model: {args.patterns} patterns, {size:.1f} MB on disk, {args.workers} workers")
+        print(f"{'load':<10}{'model USS MB/worker':>22}{'PSS MB/worker':>16}")
+        for label, mmap in (("private", False), ("mmap", True)):
+            measured = measure(path, mmap, args.vocabulary, args.workers)
+            uss = sum(item[0] for item in measured) / len(measured)
+            pss = sum(item[1] for item in measured) / len(measured)
+            print(f"{label:<10}{uss:>22.1f}{pss:>16.1f}")
@@ -0,0 +1,478 @@
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+# end-to-end benchmark of every route in endpoints.py: seeds a database at one of the
+# benchmarks.seed scales, then drives each route with concurrent requests and reports
+# p50/p95/p99 latency, throughput and memory per route as JSON.
+#
+# By default the app runs in-process on a scratch SQLite database, /chat/ answers from a
+# stub classifier (so it measures the request path, not a model) and /chat/voice talks to
+# benchmarks.fake_tts. Against a running server, seed its database with
+# `python -m benchmarks.seed --scale S --classifier tfidf`, point its TTS_URL at
+# `python -m benchmarks.fake_tts`, and pass --url; memory is then the client's.
+#
+#   python -m benchmarks.run --scale small --requests 200 --concurrency 8 --output results.json
+#   python -m benchmarks.run --database-url postgresql://bench@localhost/bench --scale large
+#   python -m benchmarks.run --url http://127.0.0.1:8000 --scale small
+
+import httpx
+from benchmarks import fake_tts
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+# answers every sentence at once, so /chat/ measures routing, pattern lookup and the database
+class StubClassifier:
+    def get_responses(self, sentences: list[str]):
+        return [f"stub reply to {sentence}" for sentence in sentences]
+
+    def get_response(self, sentence: str):
+        return self.get_responses([sentence])[0]
+
+
+# ids of the seeded rows (benchmarks.seed numbers them in order) and samples of NPC corpora
+class Fixtures:
+    def __init__(self, scale: str, hot_npcs: int, random_seed: int):
+        users, projects, npcs, intents, texts = seed.SCALES[scale]
+        self.users = users
+        self.projects = self.users * projects
+        self.npcs = self.projects * npcs
+        self.intents = self.npcs * intents
+        rng = random.Random(random_seed)
+        self.hot_npcs = rng.sample(range(1, self.npcs + 1), min(hot_npcs, self.npcs))
+        self.corpora = {}
+        self.serial = 0
+        self._lock = threading.Lock()
+
+    # a number no other request of this run has used, for unique emails and tags
+    def unique(self):
+        with self._lock:
+            self.serial += 1
+            return self.serial
+
+    def corpus(self, client, npc_id: int):
+        if npc_id not in self.corpora:
+            self.corpora[npc_id] = client.get(f"/npcs/intents/{npc_id}/").json()
+        return self.corpora[npc_id]
+
+    # half seeded patterns (answered by the pattern index), half new sentences (the classifier)
+    def sentence(self, client, rng: random.Random, npc_id: int = None):
+        npc_id = npc_id or rng.choice(self.hot_npcs)
+        patterns = [pattern for intent in self.corpus(client, npc_id) for pattern in intent["patterns"]]
+        if patterns and rng.random() < 0.5:
+            return npc_id, rng.choice(patterns)
+        return npc_id, seed.sentence(rng)
+
+
+class Scenario:
+    def __init__(self, method: str, path: str, request, prepare=None, statuses=(200,)):
+        self.method = method
+        self.path = path
+        self.request = request
+        self.prepare = prepare
+        self.statuses = statuses
+
+    @property
+    def route(self):
+        return f"{self.method} {self.path}"
+
+    @property
+    def name(self):
+        return self.route
+
+    # untimed setup shared by all calls, e.g. rows for the delete routes to delete
+    def setup(self, client, fixtures: Fixtures, count: int):
+        return self.prepare(client, fixtures, count) if self.prepare else None
+
+    # one timed call; True when it got an expected status
+    def call(self, client, fixtures: Fixtures, rng: random.Random, index: int, state):
+        path, options = self.request(client, fixtures, rng, index, state)
+        return client.request(self.method, path, **options).status_code in self.statuses
+
+    def close(self):
+        pass
+
+
+# one sentence per call over a connection each worker thread keeps open, timed until
+# the text reply (audio=false) or until the end of the audio
+class WebSocketScenario(Scenario):
+    def __init__(self, audio: bool):
+        super().__init__("WS", "/chat/ws/{npc_id}", None)
+        self.audio = audio
+        self.local = threading.local()
+        self.connections = []
+
+    @property
+    def name(self):
+        return f"{self.method} {self.path} (audio={str(self.audio).lower()})"
+
+    def call(self, client, fixtures: Fixtures, rng: random.Random, index: int, state):
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            self.local.npc_id = rng.choice(fixtures.hot_npcs)
+            context = client.websocket_connect(
+                f"/chat/ws/{self.local.npc_id}?audio={str(self.audio).lower()}")
+            connection = self.local.connection = context.__enter__()
+            self.connections.append(context)
+
+        _, sentence = fixtures.sentence(client, rng, self.local.npc_id)
+        connection.send_text(sentence)
+        message = connection.receive_json()
+        if message.get("type") != "text":
+            return False
+        while self.audio:
+            message = connection.receive()
+            if message.get("text") is not None:
+                return json.loads(message["text"]).get("type") == "audio_end"
+        return True
+
+    def close(self):
+        for context in self.connections:
+            context.__exit__(None, None, None)
+        self.connections.clear()
+        self.local = threading.local()
+
+
+def npc_body(index: int, classifier: str):
+    return {"name": f"bench npc {index}", "avatar": None, "bio": "benchmark NPC",
+            "voice": seed.VOICES[0], "style": seed.STYLES[0], "classifier": classifier, "intents": []}
+
+
+def intent_body(index: int, rng: random.Random, texts: int = 5):
+    return {"tag": f"bench intent {index}",
+            "patterns": [{"text": seed.sentence(rng)} for _ in range(texts)],
+            "responses": [{"text": seed.sentence(rng)} for _ in range(texts)]}
+
+
+def created_ids(client, count: int, method: str, path, body):
+    rng = random.Random(count)
+    ids = []
+    for index in range(count):
+        response = client.request(method, path(index), json=body(index, rng))
+        response.raise_for_status()
+        ids.append(response.json()["id"])
+    return ids
+
+
+def ndjson(fixtures: Fixtures, rng: random.Random, count: int = 10):
+    lines = []
+    for _ in range(count):
+        lines.append(json.dumps(intent_body(f"import {fixtures.unique()}", rng)))
+    return "\n".join(lines).encode("utf-8")
+
+
+def build_scenarios(classifier: str):
+    def page(rng):
+        return {"params": {"limit": 20, "skip": rng.randint(0, 5) * 20}}
+
+    def fixed(path, **options):
+        return lambda client, fixtures, rng, index, state: (path, options)
+
+    return [
+        Scenario("GET", "/", lambda c, f, rng, i, s: ("/", page(rng))),
+        Scenario("POST", "/users/", lambda c, f, rng, i, s: (
+            "/users/", {"json": {"email": f"bench{f.unique()}@example.com", "password": "benchmark"}})),
+        Scenario("GET", "/users/", lambda c, f, rng, i, s: ("/users/", page(rng))),
+        Scenario("GET", "/users/{user_id}", lambda c, f, rng, i, s: (
+            f"/users/{rng.randint(1, f.users)}", {})),
+        Scenario("POST", "/users/{user_id}/projects/", lambda c, f, rng, i, s: (
+            f"/users/{rng.randint(1, f.users)}/projects/",
+            {"json": {"name": f"bench project {f.unique()}", "description": seed.sentence(rng)}})),
+        Scenario("GET", "/projects/", lambda c, f, rng, i, s: ("/projects/", page(rng))),
+        Scenario("GET", "/intents/", lambda c, f, rng, i, s: ("/intents/", page(rng))),
+        Scenario("POST", "/intents/create/", lambda c, f, rng, i, s: (
+            "/intents/create/", {"json": intent_body(f.unique(), rng)})),
+        Scenario("POST", "/intents/import/", lambda c, f, rng, i, s: (
+            "/intents/import/", {"files": {"file": ("intents.ndjson", ndjson(f, rng), "application/x-ndjson")}})),
+        Scenario("POST", "/intents/{intent_id}/patterns/", lambda c, f, rng, i, s: (
+            f"/intents/{rng.randint(1, f.intents)}/patterns/", {"json": {"text": seed.sentence(rng)}})),
+        Scenario("POST", "/intents/{intent_id}/responses/", lambda c, f, rng, i, s: (
+            f"/intents/{rng.randint(1, f.intents)}/responses/", {"json": {"text": seed.sentence(rng)}})),
+        Scenario("DELETE", "/intents/{intent_id}/", lambda c, f, rng, i, ids: (f"/intents/{ids[i]}/", {}),
+                 prepare=lambda c, f, count: created_ids(
+                     c, count, "POST", lambda i: "/intents/create/",
+                     lambda i, rng: intent_body(f"delete {f.unique()}", rng))),
+        # rewrite an intent of a hot NPC with its current texts, so the corpus stays the same size
+        Scenario("PUT", "/intents/{intent_id}/", lambda c, f, rng, i, s: (lambda intent: (
+            f"/intents/{intent['id']}/", {"json": {
+                "tag": intent["tag"], "patterns": [{"text": text} for text in intent["patterns"]],
+                "responses": [{"text": text} for text in intent["responses"]]}}))(
+            rng.choice(f.corpus(c, rng.choice(f.hot_npcs))))),
+        Scenario("DELETE", "/projects/{project_id}/", lambda c, f, rng, i, ids: (f"/projects/{ids[i]}/", {}),
+                 prepare=lambda c, f, count: created_ids(
+                     c, count, "POST", lambda i: f"/users/{i % f.users + 1}/projects/",
+                     lambda i, rng: {"name": f"delete {f.unique()}", "description": "benchmark"})),
+        Scenario("PUT", "/projects/{project_id}/", lambda c, f, rng, i, s: (
+            f"/projects/{rng.randint(1, f.projects)}/",
+            {"json": {"name": f"project {f.unique()}", "description": seed.sentence(rng)}})),
+        Scenario("POST", "/projects/{project_id}/npc/", lambda c, f, rng, i, s: (
+            f"/projects/{rng.randint(1, f.projects)}/npc/", {"json": npc_body(f.unique(), classifier)})),
+        Scenario("GET", "/npcs/", lambda c, f, rng, i, s: ("/npcs/", page(rng))),
+        Scenario("DELETE", "/npcs/{npc_id}/", lambda c, f, rng, i, ids: (f"/npcs/{ids[i]}/", {}),
+                 prepare=lambda c, f, count: created_ids(
+                     c, count, "POST", lambda i: f"/projects/{i % f.projects + 1}/npc/",
+                     lambda i, rng: npc_body(f"delete {f.unique()}", classifier))),
+        # resave a hot NPC with its current body and intents
+        Scenario("PUT", "/npcs/{npc_id}/", lambda c, f, rng, i, bodies: (lambda npc_id: (
+            f"/npcs/{npc_id}/", {"json": bodies[npc_id]}))(rng.choice(f.hot_npcs)),
+            prepare=lambda c, f, count: {npc_id: c.get(f"/npcs/{npc_id}/").json() for npc_id in f.hot_npcs}),
+        Scenario("PUT", "/npcs/{npc_id}/avatar", lambda c, f, rng, i, s: (
+            f"/npcs/{rng.randint(1, f.npcs)}/avatar", {"json": {"avatar": f"avatar{f.unique()}.png"}})),
+        Scenario("GET", "/npcs/{npc_id}/", lambda c, f, rng, i, s: (f"/npcs/{rng.randint(1, f.npcs)}/", {})),
+        Scenario("GET", "/npcs/intents/{npc_id}/", lambda c, f, rng, i, s: (
+            f"/npcs/intents/{rng.randint(1, f.npcs)}/", {})),
+        Scenario("GET", "/npcs/{npc_id}/export", lambda c, f, rng, i, s: (
+            f"/npcs/{rng.randint(1, f.npcs)}/export", {})),
+        Scenario("GET", "/projects/{project_id}/export", lambda c, f, rng, i, s: (
+            f"/projects/{rng.randint(1, f.projects)}/export", {})),
+        Scenario("POST", "/chat/", lambda c, f, rng, i, s: (lambda npc_id, sentence: (
+            "/chat/", {"json": {"npc_id": npc_id, "sentence": sentence}}))(*f.sentence(c, rng))),
+        Scenario("POST", "/chat/batch", lambda c, f, rng, i, s: ("/chat/batch", {"json": [
+            dict(zip(("npc_id", "sentence"), f.sentence(c, rng))) for _ in range(10)]})),
+        Scenario("GET", "/chat/cache", fixed("/chat/cache")),
+        Scenario("GET", "/chat/patterns", fixed("/chat/patterns")),
+        # a tenth of the lines are new, so the mix includes both cache hits and fake TTS renders
+        Scenario("POST", "/chat/voice", lambda c, f, rng, i, s: ("/chat/voice", {"params": {
+            "voice_name": seed.VOICES[0], "style": seed.STYLES[0],
+            "text": f"line {f.unique() if rng.random() < 0.1 else rng.randint(1, 20)}"}})),
+        Scenario("GET", "/chat/voice/cache", fixed("/chat/voice/cache")),
+        WebSocketScenario(audio=False),
+        WebSocketScenario(audio=True),
+        Scenario("GET", "/async/users/", lambda c, f, rng, i, s: ("/async/users/", page(rng))),
+        Scenario("GET", "/async/users/{user_id}", lambda c, f, rng, i, s: (
+            f"/async/users/{rng.randint(1, f.users)}", {})),
+        Scenario("GET", "/async/projects/", lambda c, f, rng, i, s: ("/async/projects/", page(rng))),
+        Scenario("GET", "/async/intents/", lambda c, f, rng, i, s: ("/async/intents/", page(rng))),
+        Scenario("GET", "/async/npcs/", lambda c, f, rng, i, s: ("/async/npcs/", page(rng))),
+        Scenario("GET", "/async/npcs/{npc_id}/", lambda c, f, rng, i, s: (
+            f"/async/npcs/{rng.randint(1, f.npcs)}/", {})),
+        Scenario("GET", "/async/npcs/intents/{npc_id}/", lambda c, f, rng, i, s: (
+            f"/async/npcs/intents/{rng.randint(1, f.npcs)}/", {})),
+        Scenario("GET", "/search", lambda c, f, rng, i, s: ("/search", {"params": {
+            "q": seed.sentence(rng, 1, 3), "npc_id": rng.choice(f.hot_npcs)}
+            if rng.random() < 0.5 else {"q": seed.sentence(rng, 1, 3)}})),
+        Scenario("GET", "/search/duplicates", lambda c, f, rng, i, s: ("/search/duplicates", {
+            "params": {"project_id": rng.randint(1, f.projects)}})),
+        Scenario("GET", "/cache/responses", fixed("/cache/responses")),
+        Scenario("GET", "/metrics", fixed("/metrics")),
+        # training last: submitted jobs keep worker processes busy after their request returns
+        Scenario("POST", "/training/jobs/", lambda c, f, rng, i, s: (
+            "/training/jobs/", {"json": {"npc_id": rng.choice(f.hot_npcs)}})),
+        Scenario("GET", "/training/jobs/", fixed("/training/jobs/")),
+        Scenario("GET", "/training/jobs/{job_id}", lambda c, f, rng, i, ids: (
+            f"/training/jobs/{rng.choice(ids)}", {}),
+            prepare=lambda c, f, count: [c.post("/training/jobs/", json={"npc_id": f.hot_npcs[0]}).json()["id"]]),
+        Scenario("DELETE", "/training/jobs/{job_id}", lambda c, f, rng, i, ids: (
+            f"/training/jobs/{ids[i]}", {}),
+            prepare=lambda c, f, count: [c.post("/training/jobs/", json={"npc_id": npc_id}).json()["id"]
+                                         for npc_id in (f.hot_npcs * count)[:count]]),
+    ]
+
+
+# current and peak resident set size of this process, in MB
+def memory():
+    current = peak = None
+    try:
+        with open("/proc/self/statm") as statm:
+            current = int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        pass
+    if resource is not None:
+        # ru_maxrss is in KB on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (2 ** 20 if sys.platform == "darwin" else 2 ** 10)
+    return current, peak
+
+
+def percentile(timings: list[float], percent: int):
+    if len(timings) == 1:
+        return timings[0]
+    return statistics.quantiles(timings, n=100, method="inclusive")[percent - 1]
+
+
+def run_scenario(client, scenario: Scenario, fixtures: Fixtures):
+    state = scenario.setup(client, fixtures, args.warmup + args.requests)
+
+    def call(index):
+        rng = random.Random(f"{args.seed}:{scenario.name}:{index}")
+        start = time.perf_counter()
+        try:
+            ok = scenario.call(client, fixtures, rng, index, state)
+        except Exception:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    try:
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            list(pool.map(call, range(args.requests, args.requests + args.warmup)))
+            start = time.perf_counter()
+            results = list(pool.map(call, range(args.requests)))
+            elapsed = time.perf_counter() - start
+    finally:
+        scenario.close()
+
+    timings = sorted(timing * 1000 for timing, _ in results)
+    current, peak = memory()
+    return {
+        "route": scenario.name,
+        "requests": len(results),
+        "errors": sum(not ok for _, ok in results),
+        "p50_ms": round(percentile(timings, 50), 3),
+        "p95_ms": round(percentile(timings, 95), 3),
+        "p99_ms": round(percentile(timings, 99), 3),
+        "mean_ms": round(statistics.fmean(timings), 3),
+        "max_ms": round(timings[-1], 3),
+        "throughput_rps": round(len(results) / elapsed, 1),
+        "rss_mb": round(current, 1) if current is not None else None,
+        "peak_rss_mb": round(peak, 1) if peak is not None else None,
+    }
+
+
+# "METHOD /path" of every route the app serves, websockets as "WS /path"
+def app_routes(client):
+    if args.url:
+        paths = client.get("/openapi.json").json()["paths"]
+        return {f"{method.upper()} {path}" for path, methods in paths.items() for method in methods}
+
+    from fastapi.routing import APIRoute, APIWebSocketRoute
+    import endpoints
+    routes = set()
+    for route in endpoints.app.routes:
+        if isinstance(route, APIRoute):
+            routes.update(f"{method} {route.path}" for method in route.methods - {"HEAD"})
+        elif isinstance(route, APIWebSocketRoute):
+            routes.add(f"WS {route.path}")
+    return routes
+
+
+def print_table(results: list[dict]):
+    print(f"{'route':<52}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}{'errors':>8}{'rss MB':>8}",
+          file=sys.stderr)
+    for result in results:
+        print(f"{result['route']:<52}{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}{result['p99_ms']:>9.1f}"
+              f"{result['throughput_rps']:>9.1f}{result['errors']:>8}{result['rss_mb'] or 0:>8.0f}",
+              file=sys.stderr)
+
+
+def main():
+    scenarios = build_scenarios("tfidf" if args.url else "stub")
+    if args.routes:
+        scenarios = [scenario for scenario in scenarios if re.search(args.routes, scenario.name)]
+    if args.list:
+        print("\n".join(scenario.name for scenario in scenarios))
+        return
+
+    seeded = {}
+    if not args.url:
+        from database.database import engine
+        from database import models
+        models.Base.metadata.create_all(bind=engine)
+        if not args.no_seed:
+            start = time.perf_counter()
+            seeded = {"rows": seed.seed_scale(engine, args.scale, "stub", args.seed),
+                      "seconds": round(time.perf_counter() - start, 1)}
+
+        from fastapi.testclient import TestClient
+        from services import npcs
+        import endpoints
+        npcs.CLASSIFIERS["stub"] = lambda db, npc_id: StubClassifier()
+        client = TestClient(endpoints.app)
+        database = engine.dialect.name
+    else:
+        client = httpx.Client(base_url=args.url, timeout=60)
+        database = None
+
+    with client:
+        fixtures = Fixtures(args.scale, args.hot_npcs, args.seed)
+        routes = app_routes(client)
+        results, skipped = [], []
+        for scenario in scenarios:
+            if args.url and isinstance(scenario, WebSocketScenario):
+                skipped.append({"route": scenario.name, "reason": "websockets are only driven in-process"})
+                continue
+            print(f"{scenario.name} ...", file=sys.stderr)
+            results.append(run_scenario(client, scenario, fixtures))
+
+    if not args.routes:
+        covered = {scenario.route for scenario in scenarios}
+        skipped += [{"route": route, "reason": "no scenario"} for route in sorted(routes - covered)]
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "scale": args.scale,
+            "scale_shape": dict(zip(("users", "projects", "npcs", "intents", "texts"), seed.SCALES[args.scale])),
+            "target": args.url or "in-process",
+            "database": database,
+            "memory": "client" if args.url else "server",
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "concurrency": args.concurrency,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "seed": seeded,
+        "results": results,
+        "skipped": skipped,
+    }
+    print_table(results)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+# training jobs run in spawned processes, which import this module again: only the
+# parent process parses arguments and runs the benchmark
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark every API route on a seeded database.")
+    parser.add_argument("--scale", default="small", help="one of benchmarks.seed.SCALES")
+    parser.add_argument("--database-url", help="seed and serve this database instead of a scratch SQLite file")
+    parser.add_argument("--no-seed", action="store_true", help="the database is already seeded at --scale")
+    parser.add_argument("--url", help="benchmark a running server instead of the in-process app")
+    parser.add_argument("--requests", type=int, default=100, help="timed requests per route")
+    parser.add_argument("--warmup", type=int, default=10, help="untimed requests per route")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--routes", help="only routes whose 'METHOD /path' matches this regex")
+    parser.add_argument("--hot-npcs", type=int, default=16, help="NPCs the chat routes talk to")
+    parser.add_argument("--tts-latency", type=float, default=0.05, help="fake TTS seconds to first byte")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--list", action="store_true", help="list the routes and exit")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    if not args.url:
+        # point the app at scratch storage and the fake TTS server before anything reads the environment
+        tts_server = fake_tts.start(latency=args.tts_latency)
+        os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(directory, 'benchmark.db')}"
+        os.environ["TTS_URL"] = tts_server.url
+        os.environ["TTS_CACHE_DIR"] = os.path.join(directory, "tts_cache")
+        os.environ["RESPONSE_CACHE_PATH"] = os.path.join(directory, "response_cache.sqlite3")
+        os.environ.setdefault("AZURE_API_KEY", "benchmark")
+
+    # imports the database models, so only now that DATABASE_URL is set
+    from benchmarks import seed
+    if args.scale not in seed.SCALES:
+        parser.error(f"--scale must be one of {', '.join(seed.SCALES)}")
+
+    try:
+        main()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
@@ -0,0 +1,120 @@
+import argparse
+import random
+import time
+from sqlalchemy import insert, text
+from database import models
+
+# synthetic data generator: users -> projects -> NPCs -> intents -> patterns & responses,
+# inserted in batches with explicit ids into an empty database. Deterministic for a given seed.
+#
+#   python -m benchmarks.seed --scale medium        (uses DATABASE_URL)
+
+# (users, projects per user, NPCs per project, intents per NPC, patterns/responses per intent)
+SCALES = {
+    "tiny": (2, 2, 2, 5, 3),            # ~350 rows
+    "small": (10, 5, 5, 10, 5),         # ~30k rows
+    "medium": (50, 5, 10, 20, 5),       # ~600k rows
+    "large": (200, 5, 10, 20, 5),       # ~2.4M rows
+    "xlarge": (1000, 5, 10, 20, 5),     # ~12M rows
+}
+
+WORDS = (
+    "hello hi hey greetings where is the castle town market river bridge forest cave "
+    "how do i get to find buy sell trade sword shield potion armor gold coin quest dragon "
+    "king queen guard knight wizard magic spell tavern inn food drink ale bread room night "
+    "what who why when can you help me tell about yourself name job work weather rain sun "
+    "north south east west road path map lost danger monster goblin wolf bandit reward"
+).split()
+
+VOICES = ["en-AU-NatashaNeural", "en-GB-RyanNeural", "en-US-JennyNeural", "en-US-GuyNeural"]
+STYLES = ["cheerful", "sad", "angry", "friendly", "whispering"]
+
+
+def sentence(rng: random.Random, low: int = 3, high: int = 9):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(low, high)))
+
+
+class Batches:
+    def __init__(self, connection, batch_size: int):
+        self.connection = connection
+        self.batch_size = batch_size
+        self.pending = {}
+        self.counts = {}
+
+    def add(self, table, row: dict):
+        rows = self.pending.setdefault(table, [])
+        rows.append(row)
+        if len(rows) >= self.batch_size:
+            self.flush(table)
+
+    def flush(self, table=None):
+        for pending_table in [table] if table is not None else list(self.pending):
+            rows = self.pending.pop(pending_table, [])
+            if rows:
+                self.connection.execute(insert(pending_table), rows)
+                self.counts[pending_table.name] = self.counts.get(pending_table.name, 0) + len(rows)
+
+
+# seed an empty database; returns the row count of every table
+def seed(engine, users: int, projects: int, npcs: int, intents: int, texts: int,
+         classifier: str = "chatbot", batch_size: int = 10000, random_seed: int = 0):
+    rng = random.Random(random_seed)
+    project_id = npc_id = intent_id = pattern_id = response_id = 0
+
+    with engine.begin() as connection:
+        batches = Batches(connection, batch_size)
+        for user_id in range(1, users + 1):
+            batches.add(models.User.__table__, {
+                "id": user_id, "email": f"user{user_id}@example.com", "password": "benchmark"})
+            for _ in range(projects):
+                project_id += 1
+                batches.add(models.Project.__table__, {
+                    "id": project_id, "name": f"project {project_id}",
+                    "description": sentence(rng, 8, 20), "user_id": user_id})
+                for _ in range(npcs):
+                    npc_id += 1
+                    batches.add(models.NPC.__table__, {
+                        "id": npc_id, "name": f"npc {npc_id}", "avatar": None,
+                        "bio": sentence(rng, 10, 30), "voice": rng.choice(VOICES),
+                        "style": rng.choice(STYLES), "classifier": classifier,
+                        "project_id": project_id})
+                    batches.add(models.ProjectNPC, {"project_id": project_id, "npc_id": npc_id})
+                    for _ in range(intents):
+                        intent_id += 1
+                        batches.add(models.Intent.__table__, {"id": intent_id, "tag": f"intent{intent_id}"})
+                        batches.add(models.NPCIntent, {"npc_id": npc_id, "intent_id": intent_id})
+                        for _ in range(texts):
+                            pattern_id += 1
+                            batches.add(models.Pattern.__table__, {
+                                "id": pattern_id, "text": sentence(rng), "intent_id": intent_id})
+                            response_id += 1
+                            batches.add(models.Response.__table__, {
+                                "id": response_id, "text": sentence(rng), "intent_id": intent_id})
+        batches.flush()
+
+        # explicit ids leave PostgreSQL sequences behind; move them past the seeded rows
+        if engine.dialect.name == "postgresql":
+            for table in ("users", "projects", "npcs", "intents", "patterns", "responses"):
+                connection.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                    f"COALESCE((SELECT MAX(id) FROM {table}), 0) + 1, false)"))
+    return batches.counts
+
+
+def seed_scale(engine, scale: str, classifier: str = "chatbot", random_seed: int = 0):
+    return seed(engine, *SCALES[scale], classifier=classifier, random_seed=random_seed)
+
+
+if __name__ == "__main__":
+    from database.database import engine
+
+    parser = argparse.ArgumentParser(description="Seed DATABASE_URL with synthetic data.")
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--classifier", default="chatbot")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=engine)
+    start = time.perf_counter()
+    counts = seed_scale(engine, args.scale, args.classifier, args.seed)
+    print(counts, f"in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,79 @@
+import argparse
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+# compare the two serialization modes of the list endpoints on a seeded SQLite database:
+#   pydantic: ORM tree -> orm_mode validation -> jsonable_encoder -> json.dumps (response_model path)
+#   fast:     column-only queries -> plain dicts -> services.serialization.encode
+#
+#   python -m benchmarks.serialization --users 20 --projects 5 --npcs 5 --intents 10
+
+parser = argparse.ArgumentParser(description="Benchmark the pydantic and fast serialization paths.")
+parser.add_argument("--users", type=int, default=20)
+parser.add_argument("--projects", type=int, default=5, help="projects per user")
+parser.add_argument("--npcs", type=int, default=5, help="NPCs per project")
+parser.add_argument("--intents", type=int, default=10, help="intents per NPC")
+parser.add_argument("--texts", type=int, default=5, help="patterns and responses per intent")
+parser.add_argument("--limit", type=int, default=100, help="page size")
+parser.add_argument("--repeat", type=int, default=10)
+args = parser.parse_args()
+
+# point the app at a scratch database before anything opens the engine
+directory = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(directory, 'benchmark.db')}"
+
+from fastapi.encoders import jsonable_encoder
+from database.database import SessionLocal, engine
+from database import models
+import schemas
+from services import users, projects, intents, npcs, serialization
+from benchmarks.seed import seed
+
+
+def pydantic_body(schema, rows):
+    data = jsonable_encoder([schema.from_orm(row) for row in rows])
+    return json.dumps(data, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+CASES = [
+    ("users", lambda db: pydantic_body(schemas.User, users.get_users(db, limit=args.limit)),
+     lambda db: serialization.encode(serialization.get_users(db, limit=args.limit))),
+    ("projects", lambda db: pydantic_body(schemas.Project, projects.get_projects(db, limit=args.limit)),
+     lambda db: serialization.encode(serialization.get_projects(db, limit=args.limit))),
+    ("npcs", lambda db: pydantic_body(schemas.NPC, npcs.get_npcs(db, limit=args.limit)),
+     lambda db: serialization.encode(serialization.get_npcs(db, limit=args.limit))),
+    ("intents", lambda db: pydantic_body(schemas.Intent, intents.get_intents(db, limit=args.limit)),
+     lambda db: serialization.encode(serialization.get_intents(db, limit=args.limit))),
+]
+
+
+# median wall time of serialize(db) over fresh sessions, so no run reuses another's identity map
+def measure(serialize):
+    timings = []
+    body = None
+    for _ in range(args.repeat):
+        db = SessionLocal()
+        try:
+            start = time.perf_counter()
+            body = serialize(db)
+            timings.append(time.perf_counter() - start)
+        finally:
+            db.close()
+    return statistics.median(timings), body
+
+
+models.Base.metadata.create_all(bind=engine)
+seed(engine, args.users, args.projects, args.npcs, args.intents, args.texts)
+print(f"{'endpoint':<10}{'pydantic ms':>14}{'fast ms':>10}{'speedup':>10}{'bytes':>10}  identical")
+for name, pydantic_path, fast_path in CASES:
+    pydantic_time, pydantic_output = measure(pydantic_path)
+    fast_time, fast_output = measure(fast_path)
+    print(f"{name:<10}{pydantic_time * 1000:>14.1f}{fast_time * 1000:>10.1f}"
+          f"{pydantic_time / fast_time:>9.1f}x{len(fast_output):>10}  {pydantic_output == fast_output}")
+
+engine.dispose()
+shutil.rmtree(directory)
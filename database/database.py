@@ -1,4 +1,6 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
@@ -7,14 +9,121 @@ from dotenv import load_dotenv
 # grab database connection URL from .env file
 load_dotenv()
 DATABASE_URL = os.getenv("DATABASE_URL")
+# optional read-only replica; GET endpoints read from it when set
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+# create missing tables when the app starts; turn off where the schema is managed with Alembic
+CREATE_ALL = os.getenv("DB_CREATE_ALL", "true").lower() in ("1", "true", "yes")
+
+# named engine profiles, picked with DB_PROFILE; the DB_* variables below override single settings
+ENGINE_PROFILES = {
+    "default": {},
+    "small": {"pool_size": 5, "max_overflow": 5, "pool_recycle": 1800, "pool_pre_ping": True},
+    "large": {"pool_size": 20, "max_overflow": 40, "pool_recycle": 1800, "pool_pre_ping": True},
+}
+ENGINE_SETTINGS = {
+    "pool_size": ("DB_POOL_SIZE", int),
+    "max_overflow": ("DB_MAX_OVERFLOW", int),
+    "pool_recycle": ("DB_POOL_RECYCLE", int),
+    "pool_timeout": ("DB_POOL_TIMEOUT", int),
+    "pool_pre_ping": ("DB_POOL_PRE_PING", lambda value: value.lower() in ("1", "true", "yes")),
+}
+# applied to every new SQLite connection; override with DB_SQLITE_PRAGMAS="journal_mode=WAL,synchronous=NORMAL"
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": "5000",
+}
+
+
+def get_engine_options(url: str):
+    options = dict(ENGINE_PROFILES[os.getenv("DB_PROFILE", "default")])
+    for name, (variable, parse) in ENGINE_SETTINGS.items():
+        if os.getenv(variable):
+            options[name] = parse(os.getenv(variable))
+    # SQLite connections are local files, pool sizing doesn't apply to them
+    if make_url(url).get_backend_name() == "sqlite":
+        options.pop("pool_size", None)
+        options.pop("max_overflow", None)
+    return options
+
+
+def get_sqlite_pragmas():
+    if not os.getenv("DB_SQLITE_PRAGMAS"):
+        return SQLITE_PRAGMAS
+    return dict(pair.split("=", 1) for pair in os.getenv("DB_SQLITE_PRAGMAS").split(",") if pair)
+
+
+def apply_sqlite_pragmas(sync_engine):
+    if sync_engine.dialect.name != "sqlite":
+        return
+    pragmas = get_sqlite_pragmas()
+
+    @event.listens_for(sync_engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def build_engine(url: str):
+    db_engine = create_engine(url, **get_engine_options(url))
+    apply_sqlite_pragmas(db_engine)
+    return db_engine
+
 
 # establish connection database using SQLAlchemy ORM
 SQLALCHEMY_DATABASE_URL = DATABASE_URL
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+engine = build_engine(SQLALCHEMY_DATABASE_URL)
+replica_engine = build_engine(DATABASE_REPLICA_URL) if DATABASE_REPLICA_URL else engine
 
-# the database session
+# the database session (writes go to the primary)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# the read-only database session (the replica when configured, else the primary)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=replica_engine)
+
 # base class to create a database model/table
 Base = declarative_base()
+
+
+# async driver for each supported database backend
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+    "mysql": "mysql+aiomysql",
+}
+
+
+def to_async_url(url: str):
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+
+
+# the async engines (same databases, async drivers) are created on first use, so
+# the async driver is only needed once an async endpoint is called
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL")
+_async_engines = {}
+
+
+def get_async_engine(read_only: bool = False):
+    url = ASYNC_DATABASE_URL or to_async_url(SQLALCHEMY_DATABASE_URL)
+    if read_only and DATABASE_REPLICA_URL:
+        url = to_async_url(DATABASE_REPLICA_URL)
+    if url not in _async_engines:
+        async_engine = create_async_engine(url, **get_engine_options(str(url)))
+        apply_sqlite_pragmas(async_engine.sync_engine)
+        _async_engines[url] = async_engine
+    return _async_engines[url]
+
+
+async def dispose_async_engine():
+    for async_engine in _async_engines.values():
+        await async_engine.dispose()
+    _async_engines.clear()
+
+
+# the async database session; bind it with AsyncSessionLocal(bind=get_async_engine())
+AsyncSessionLocal = sessionmaker(
+    class_=AsyncSession, autoflush=False, expire_on_commit=False)
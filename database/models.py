@@ -1,18 +1,22 @@
 from .database import Base
-from sqlalchemy import Table, Integer, String, ForeignKey, Column, Boolean
+from sqlalchemy import Table, Integer, String, ForeignKey, Column, Boolean, LargeBinary, Float
 from sqlalchemy.orm import relationship
 
 
 # weak entity relationships:
 
 ProjectNPC = Table('project_npcs', Base.metadata,
-                   Column('project_id', Integer, ForeignKey('projects.id')),
-                   Column('npc_id', Integer, ForeignKey('npcs.id'))
+                   Column('project_id', Integer, ForeignKey(
+                       'projects.id'), primary_key=True),
+                   Column('npc_id', Integer, ForeignKey(
+                       'npcs.id'), primary_key=True, index=True)
                    )
 
 NPCIntent = Table('npc_intents', Base.metadata,
-                  Column('npc_id', Integer, ForeignKey('npcs.id')),
-                  Column('intent_id', Integer, ForeignKey('intents.id'))
+                  Column('npc_id', Integer, ForeignKey(
+                      'npcs.id'), primary_key=True),
+                  Column('intent_id', Integer, ForeignKey(
+                      'intents.id'), primary_key=True, index=True)
                   )
 
 # database ORM models and relationships
@@ -26,18 +30,19 @@ class User(Base):
     password = Column(String)
 
     projects = relationship(
-        "Project", back_populates="user", cascade='all, delete')
+        "Project", back_populates="user", cascade='all, delete', order_by="Project.id")
 
 
 class Project(Base):
     __tablename__ = "projects"
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
-    description = Column(String, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    description = Column(String)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
 
     npcs = relationship("NPC", secondary="project_npcs",
-                        back_populates="projects", lazy="joined", cascade='all, delete')
+                        back_populates="projects", lazy="joined", cascade='all, delete',
+                        order_by="NPC.id")
     user = relationship("User", back_populates="projects")
 
 
@@ -46,9 +51,9 @@ class Intent(Base):
     id = Column(Integer, primary_key=True, index=True)
     tag = Column(String, index=True)
     patterns = relationship(
-        "Pattern", back_populates="intent", cascade='all, delete')
+        "Pattern", back_populates="intent", cascade='all, delete', order_by="Pattern.id")
     responses = relationship(
-        "Response", back_populates="intent", cascade='all, delete')
+        "Response", back_populates="intent", cascade='all, delete', order_by="Response.id")
     npcs = relationship("NPC", secondary="npc_intents",
                         back_populates="intents")
 
@@ -56,8 +61,8 @@ class Intent(Base):
 class Pattern(Base):
     __tablename__ = "patterns"
     id = Column(Integer, primary_key=True, index=True)
-    text = Column(String, index=True)
-    intent_id = Column(Integer, ForeignKey("intents.id"))
+    text = Column(String)
+    intent_id = Column(Integer, ForeignKey("intents.id"), index=True)
 
     intent = relationship("Intent", back_populates="patterns")
 
@@ -65,8 +70,8 @@ class Pattern(Base):
 class Response(Base):
     __tablename__ = "responses"
     id = Column(Integer, primary_key=True, index=True)
-    text = Column(String, index=True)
-    intent_id = Column(Integer, ForeignKey("intents.id"))
+    text = Column(String)
+    intent_id = Column(Integer, ForeignKey("intents.id"), index=True)
 
     intent = relationship("Intent", back_populates="responses")
 
@@ -75,13 +80,58 @@ class NPC(Base):
     __tablename__ = "npcs"
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
-    avatar = Column(String, index=True)
-    bio = Column(String, index=True)
-    voice = Column(String, index=True)
-    style = Column(String, index=True)
+    avatar = Column(String)
+    bio = Column(String)
+    voice = Column(String)
+    style = Column(String)
+    # intent classifier backend answering chats: "chatbot" (NpcTrainerAI) or "tfidf"
+    classifier = Column(String, default="chatbot")
     project_id = Column(Integer, ForeignKey("projects.id"))
 
     projects = relationship(
         "Project", secondary="project_npcs", back_populates="npcs")
     intents = relationship(
-        "Intent", secondary="npc_intents", back_populates="npcs", lazy="joined")
+        "Intent", secondary="npc_intents", back_populates="npcs", lazy="joined",
+        order_by="Intent.id")
+    model = relationship(
+        "NPCModel", back_populates="npc", uselist=False, cascade='all, delete')
+    snapshot = relationship(
+        "NPCSnapshot", back_populates="npc", uselist=False, cascade='all, delete')
+
+
+# fingerprint of the intent corpus the NPC's chatbot model was last trained on
+class NPCModel(Base):
+    __tablename__ = "npc_models"
+    npc_id = Column(Integer, ForeignKey("npcs.id"), primary_key=True)
+    fingerprint = Column(String)
+
+    npc = relationship("NPC", back_populates="model")
+
+
+# pre-serialized responses of /npcs/{id}/ and /npcs/intents/{id}/, rebuilt whenever the NPC
+# or one of its intents changes
+class NPCSnapshot(Base):
+    __tablename__ = "npc_snapshots"
+    npc_id = Column(Integer, ForeignKey("npcs.id"), primary_key=True)
+    npc_body = Column(LargeBinary)
+    npc_etag = Column(String)
+    intents_body = Column(LargeBinary)
+    intents_etag = Column(String)
+
+    npc = relationship("NPC", back_populates="snapshot")
+
+
+# chatbot training jobs, shared by every worker so an NPC is trained by one of them at a time
+class TrainingJob(Base):
+    __tablename__ = "training_jobs"
+    id = Column(String, primary_key=True)
+    npc_id = Column(Integer, index=True)
+    fingerprint = Column(String)
+    # queued, running, succeeded, failed or cancelled
+    state = Column(String, default="queued")
+    # the NPC's id while the job is queued or running, NULL after: at most one job in flight per NPC
+    active_npc_id = Column(Integer, unique=True)
+    error = Column(String)
+    created_at = Column(Float)
+    started_at = Column(Float)
+    finished_at = Column(Float)
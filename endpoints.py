@@ -1,17 +1,18 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, Query, Request, Response, UploadFile, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
-from database.database import engine, SessionLocal
+from contextlib import asynccontextmanager
+from database.database import engine, SessionLocal, ReadSessionLocal, AsyncSessionLocal, get_async_engine, dispose_async_engine, CREATE_ALL
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+import json
+import httpx
 import schemas
-import requests
-from fastapi.responses import StreamingResponse
-from dotenv import load_dotenv
-import os
-from pydub import AudioSegment
-from pydub.playback import play
-from services import users, projects, intents, npcs
+from typing import Optional
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from services import users, projects, intents, npcs, model_cache, training, tts, tts_cache, pagination, imports, exports, response_cache, snapshots, serialization, search, pattern_index, chat_sessions, metrics, preload
 from database import models
-models.Base.metadata.create_all(bind=engine)
 
 # Inject database dependencies into FastAPI
 # Independent database session/connection per request, closes the session after request is finished.
@@ -25,8 +26,44 @@ def get_db():
         db.close()
 
 
+# read-only session for GET endpoints, served by the replica when one is configured
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+# async equivalents for the async read endpoints: no worker thread is held while waiting on the database
+async def get_async_db():
+    async with AsyncSessionLocal(bind=get_async_engine()) as db:
+        yield db
+
+
+async def get_async_read_db():
+    async with AsyncSessionLocal(bind=get_async_engine(read_only=True)) as db:
+        yield db
+
+
+# startup: create missing tables (DB_CREATE_ALL) and preload the most-used NPC models
+# (PRELOAD_NPCS) before taking traffic; shutdown: release the pools and training workers
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if CREATE_ALL:
+        await run_in_threadpool(models.Base.metadata.create_all, bind=engine)
+    if preload.enabled():
+        await run_in_threadpool(lambda: preload.preload(preload.get_npc_ids()))
+    yield
+    if preload.enabled():
+        await run_in_threadpool(preload.save_usage)
+    training.shutdown()
+    await tts.close_client()
+    await dispose_async_engine()
+
+
 # create FastAPI object
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Set up CORS middleware
 origins = [
@@ -44,19 +81,84 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "ETag", "Server-Timing"],
 )
 
-# access to Azure Text-To-Speech API
-load_dotenv()
-API_KEY = os.getenv("AZURE_API_KEY")
+# per-request stage timings and SQL counts, served at /metrics
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Keyset pagination: list endpoints accept an opaque `cursor` and return the
+# next page's token in the X-Next-Cursor header (absent on the last page).
+
+
+def get_after_id(cursor: Optional[str]):
+    if cursor is None:
+        return None
+    try:
+        return pagination.decode_cursor(cursor)
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+
+
+def get_page_headers(items: list, limit: int, total: Optional[int] = None):
+    headers = {}
+    cursor = pagination.next_cursor(items, limit)
+    if cursor is not None:
+        headers["X-Next-Cursor"] = cursor
+    if total is not None:
+        headers["X-Total-Count"] = str(total)
+    return headers
+
+
+def set_page_headers(response: Response, items: list, limit: int, total: Optional[int] = None):
+    response.headers.update(get_page_headers(items, limit, total))
+
+# Fast serialization (SERIALIZATION_MODE=fast): list endpoints encode plain rows
+# built by services.serialization instead of validating ORM trees through response_model.
+
+
+def json_response(data, headers: Optional[dict] = None):
+    return Response(content=serialization.encode(data), media_type="application/json",
+                    headers=headers)
+
+# Response cache: cached GET endpoints serve the serialized response of the
+# resource's current version, with an ETag; a matching If-None-Match gets 304.
+# They read the primary, so a response built after a write always includes it.
+# The NPC endpoints serve their materialized snapshot the same way.
 
 
+def to_json(data):
+    return json.dumps(jsonable_encoder(data), ensure_ascii=False, allow_nan=False,
+                      separators=(",", ":")).encode("utf-8")
+
+
+def etag_response(request: Request, body: bytes, etag: str, headers: Optional[dict] = None):
+    headers = {**(headers or {}), "ETag": etag, "Cache-Control": "no-cache"}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in
+                          [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def cached_response(request: Request, resource: str, build):
+    variant = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+    # an /async/ endpoint serves the same entries as its sync twin
+    path = request.url.path.removeprefix("/async")
+    entry = response_cache.get_or_build(resource, f"{path}?{variant}", build)
+    return etag_response(request, entry.body, entry.etag, entry.headers)
+
 # API Requests/Endpoints
 
 # root api endpoint
 @app.get("/")
-def get_root(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    db_intents = intents.get_intents(db, skip=skip, limit=limit)
+def get_root(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None,
+             include_total: bool = False, db: Session = Depends(get_read_db)):
+    db_intents = intents.get_intents(
+        db, skip=skip, limit=limit, load_tree=False, after_id=get_after_id(cursor))
+    set_page_headers(response, db_intents, limit,
+                     intents.count_intents(db) if include_total else None)
     return db_intents
 
 # create user
@@ -73,15 +175,30 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
 
 
 @app.get("/users/", response_model=list[schemas.User])
-def read_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    db_users = users.get_users(db, skip=skip, limit=limit)
+def read_users(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None,
+               include_total: bool = False, db: Session = Depends(get_read_db)):
+    after_id = get_after_id(cursor)
+    total = users.count_users(db) if include_total else None
+    if serialization.FAST:
+        rows = serialization.get_users(db, skip=skip, limit=limit, after_id=after_id)
+        return json_response(rows, get_page_headers(rows, limit, total))
+
+    db_users = users.get_users(
+        db, skip=skip, limit=limit, after_id=after_id)
+    set_page_headers(response, db_users, limit, total)
     return db_users
 
 # get user by ID
 
 
 @app.get("/users/{user_id}", response_model=schemas.User)
-def read_user(user_id: int, db: Session = Depends(get_db)):
+def read_user(user_id: int, db: Session = Depends(get_read_db)):
+    if serialization.FAST:
+        row = serialization.get_user(db, user_id)
+        if row is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        return json_response(row)
+
     db_user = users.get_user(db, user_id=user_id)
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
@@ -101,17 +218,43 @@ def create_project_for_user(
 
 
 @app.get("/projects/", response_model=list[schemas.Project])
-def read_projects(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    db_projects = projects.get_projects(db, skip=skip, limit=limit)
-    return db_projects
+def read_projects(request: Request, skip: int = 0, limit: int = 100, cursor: Optional[str] = None,
+                  include_total: bool = False, db: Session = Depends(get_db)):
+    after_id = get_after_id(cursor)
+
+    def build():
+        total = projects.count_projects(db) if include_total else None
+        if serialization.FAST:
+            rows = serialization.get_projects(db, skip=skip, limit=limit, after_id=after_id)
+            return serialization.encode(rows), get_page_headers(rows, limit, total)
+
+        db_projects = projects.get_projects(
+            db, skip=skip, limit=limit, after_id=after_id)
+        headers = get_page_headers(db_projects, limit, total)
+        return to_json([schemas.Project.from_orm(p) for p in db_projects]), headers
+
+    return cached_response(request, "projects", build)
 
 # get all intents
 
 
 @app.get("/intents/", response_model=list[schemas.Intent])
-def read_intents(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    db_intents = intents.get_intents(db, skip=skip, limit=limit)
-    return db_intents
+def read_intents(request: Request, skip: int = 0, limit: int = 100, cursor: Optional[str] = None,
+                 include_total: bool = False, db: Session = Depends(get_db)):
+    after_id = get_after_id(cursor)
+
+    def build():
+        total = intents.count_intents(db) if include_total else None
+        if serialization.FAST:
+            rows = serialization.get_intents(db, skip=skip, limit=limit, after_id=after_id)
+            return serialization.encode(rows), get_page_headers(rows, limit, total)
+
+        db_intents = intents.get_intents(
+            db, skip=skip, limit=limit, after_id=after_id)
+        headers = get_page_headers(db_intents, limit, total)
+        return to_json([schemas.Intent.from_orm(i) for i in db_intents]), headers
+
+    return cached_response(request, "intents", build)
 
 # create intent
 
@@ -126,6 +269,21 @@ def create_intent(intent: schemas.IntentCreate, db: Session = Depends(get_db)):
     return intents.create_intent(db=db, intent=intent)
 
 
+# bulk import intents from an intents.json or NDJSON file
+
+
+@app.post("/intents/import/", response_model=schemas.IntentImportReport)
+def import_intents(file: UploadFile, format: Optional[str] = None, db: Session = Depends(get_db)):
+    file_format = imports.detect_format(file.filename, format)
+    if file_format not in ("json", "ndjson"):
+        raise HTTPException(
+            status_code=400, detail="Format must be 'json' or 'ndjson'")
+    try:
+        return imports.import_intents(db, imports.open_text(file.file), file_format)
+    except (ValueError, UnicodeDecodeError) as error:
+        raise HTTPException(status_code=400, detail=str(error))
+
+
 # create pattern for intent
 
 
@@ -208,18 +366,34 @@ def update_project(project_id: int, project: schemas.ProjectCreate, db: Session
 # # # NOTE: NEW** create NPC for project
 
 
+def check_classifier(classifier: str):
+    if classifier not in npcs.CLASSIFIERS:
+        raise HTTPException(
+            status_code=400, detail=f"Classifier must be one of {sorted(npcs.CLASSIFIERS)}")
+
+
 @app.post("/projects/{project_id}/npc/", response_model=schemas.NPC)
 def create_npc_for_project(
     project_id: int, npc: schemas.NPCCreate, db: Session = Depends(get_db)
 ):
+    check_classifier(npc.classifier)
     return npcs.create_project_npc(db=db, npc=npc, project_id=project_id)
 
 # get all NPCs
 
 
 @app.get("/npcs/", response_model=list[schemas.NPC])
-def read_npcs(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    db_npcs = npcs.get_npcs(db, skip=skip, limit=limit)
+def read_npcs(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None,
+              include_total: bool = False, db: Session = Depends(get_read_db)):
+    after_id = get_after_id(cursor)
+    total = npcs.count_npcs(db) if include_total else None
+    if serialization.FAST:
+        rows = serialization.get_npcs(db, skip=skip, limit=limit, after_id=after_id)
+        return json_response(rows, get_page_headers(rows, limit, total))
+
+    db_npcs = npcs.get_npcs(
+        db, skip=skip, limit=limit, after_id=after_id)
+    set_page_headers(response, db_npcs, limit, total)
     return db_npcs
 
 
@@ -228,7 +402,7 @@ def read_npcs(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
 
 @app.delete("/npcs/{npc_id}/")
 def delete_npc(npc_id: int, db: Session = Depends(get_db)):
-    db_npc = npcs.get_npc(db, npc_id=npc_id)
+    db_npc = npcs.get_npc(db, npc_id=npc_id, load_tree=False)
     if db_npc is None:
         raise HTTPException(
             status_code=404, detail="NPC with that ID not found")
@@ -240,7 +414,8 @@ def delete_npc(npc_id: int, db: Session = Depends(get_db)):
 
 @app.put("/npcs/{npc_id}/", response_model=schemas.NPC)
 def update_npc(npc_id: int, npc: schemas.NPCCreate, db: Session = Depends(get_db)):
-    db_npc = npcs.get_npc(db, npc_id=npc_id)
+    check_classifier(npc.classifier)
+    db_npc = npcs.get_npc(db, npc_id=npc_id, load_tree=False)
     if db_npc is None:
         raise HTTPException(
             status_code=404, detail="NPC with that ID not found")
@@ -251,7 +426,7 @@ def update_npc(npc_id: int, npc: schemas.NPCCreate, db: Session = Depends(get_db
 
 @app.put("/npcs/{npc_id}/avatar", response_model=schemas.NPC)
 def update_npc_avatar(npc_id: int, avatar_update: schemas.AvatarUpdate, db: Session = Depends(get_db)):
-    db_npc = npcs.get_npc(db, npc_id=npc_id)
+    db_npc = npcs.get_npc(db, npc_id=npc_id, load_tree=False)
     if db_npc is None:
         raise HTTPException(
             status_code=404, detail="NPC with that ID not found")
@@ -262,92 +437,319 @@ def update_npc_avatar(npc_id: int, avatar_update: schemas.AvatarUpdate, db: Sess
 
 
 @app.get("/npcs/{npc_id}/", response_model=schemas.NPC)
-def get_npc(npc_id: int, db: Session = Depends(get_db)):
-    db_npc = npcs.get_npc(db, npc_id=npc_id)
-    if db_npc is None:
+def get_npc(request: Request, npc_id: int, db: Session = Depends(get_read_db)):
+    snapshot = snapshots.get_npc(db, npc_id)
+    if snapshot is None:
         raise HTTPException(
             status_code=404, detail="NPC with that ID not found")
-    return npcs.get_npc(db=db, npc_id=npc_id)
+    return etag_response(request, *snapshot)
 
 # get intents of npc by ID
 
 
 @app.get("/npcs/intents/{npc_id}/")
-def get_npc(npc_id: int, db: Session = Depends(get_db)):
-    db_npc = npcs.get_npc(db, npc_id=npc_id)
-    if db_npc is None:
+def get_npc_intents(request: Request, npc_id: int, db: Session = Depends(get_read_db)):
+    snapshot = snapshots.get_intents(db, npc_id)
+    if snapshot is None:
         raise HTTPException(
             status_code=404, detail="NPC with that ID not found")
-    return npcs.get_intents(db=db, npc_id=npc_id)
+    return etag_response(request, *snapshot)
+
+
+# stream an NPC's training corpus as NDJSON (or in the intents.json shape)
+
+
+@app.get("/npcs/{npc_id}/export")
+def export_npc_corpus(npc_id: int, format: str = "ndjson", db: Session = Depends(get_read_db)):
+    if format not in ("json", "ndjson"):
+        raise HTTPException(
+            status_code=400, detail="Format must be 'json' or 'ndjson'")
+    if not npcs.get_existing_npc_ids(db, [npc_id]):
+        raise HTTPException(
+            status_code=404, detail="NPC with that ID not found")
+    return StreamingResponse(exports.stream_npc_corpus(npc_id, format),
+                             media_type=exports.media_type(format))
+
+# stream the training corpora of every NPC in a project
+
+
+@app.get("/projects/{project_id}/export")
+def export_project_corpus(project_id: int, format: str = "ndjson", db: Session = Depends(get_read_db)):
+    if format not in ("json", "ndjson"):
+        raise HTTPException(
+            status_code=400, detail="Format must be 'json' or 'ndjson'")
+    if not projects.project_exists(db, project_id):
+        raise HTTPException(
+            status_code=404, detail="Project with that ID not found")
+    return StreamingResponse(exports.stream_project_corpus(project_id, format),
+                             media_type=exports.media_type(format))
 
 
 # get response from AI chatbot/NPC
 @app.post("/chat/")
-def chat(request_body: dict, db: Session = Depends(get_db)):
-    npc_id = request_body.get("npc_id")
-    sentence = request_body.get("sentence")
-    training_required = request_body.get("training_required")
+def chat(request_body: schemas.ChatRequest, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+    npc_id = request_body.npc_id
+    sentence = request_body.sentence
 
     # check if the NPC has a valid ID first.
-    db_npc = npcs.get_npc(db, npc_id=npc_id)
+    with metrics.stage("npc_lookup"):
+        db_npc = npcs.get_npc(db, npc_id=npc_id, load_tree=False)
     if db_npc is None:
         raise HTTPException(
             status_code=404, detail="NPC with that ID not found")
 
-    response = npcs.get_response(
-        sentence=sentence, npc_id=npc_id, training_required=training_required)
-    get_voice(db_npc.voice, response, db_npc.style)
+    try:
+        response = npcs.get_response(db, sentence=sentence, npc_id=npc_id)
+    except training.TrainingFailed as error:
+        raise HTTPException(status_code=503, detail=str(error))
+    # render the reply's audio in the background so /chat/voice serves it from the cache
+    background_tasks.add_task(tts.prefetch, db_npc.voice, response, db_npc.style)
     return response
 
 
-# NOTE: Get Microsoft Azure Text-To-Speech; save it to MP3 file; then play:
+# get responses for many sentences across many NPCs in one request
+
+
+@app.post("/chat/batch", response_model=list[schemas.ChatReply])
+def chat_batch(items: list[schemas.ChatItem], db: Session = Depends(get_db)):
+    # group the sentences by NPC so each model classifies its group in one call
+    groups = {}
+    for index, item in enumerate(items):
+        groups.setdefault(item.npc_id, []).append(index)
+
+    missing = set(groups) - npcs.get_existing_npc_ids(db, list(groups))
+    if missing:
+        raise HTTPException(
+            status_code=404, detail=f"NPCs with IDs {sorted(missing)} not found")
+
+    replies = [None] * len(items)
+    for npc_id, indexes in groups.items():
+        try:
+            responses = npcs.get_responses(
+                db, [items[i].sentence for i in indexes], npc_id=npc_id)
+        except training.TrainingFailed as error:
+            raise HTTPException(status_code=503, detail=str(error))
+        for index, response in zip(indexes, responses):
+            replies[index] = schemas.ChatReply(
+                npc_id=npc_id, sentence=items[index].sentence, response=response)
+    return replies
+
+
+# hit/miss stats of the in-process chatbot model cache
+@app.get("/chat/cache")
+def get_model_cache_stats():
+    return model_cache.models.stats()
+
+
+# how many chat sentences were answered by pattern match instead of the model
+@app.get("/chat/patterns")
+def get_pattern_index_stats():
+    return pattern_index.indexes.stats()
+
+
+# submit a background training job for an NPC
+
+
+@app.post("/training/jobs/", response_model=schemas.TrainingJob)
+def create_training_job(job: schemas.TrainingJobCreate, db: Session = Depends(get_db)):
+    db_npc = npcs.get_npc(db, npc_id=job.npc_id, load_tree=False)
+    if db_npc is None:
+        raise HTTPException(
+            status_code=404, detail="NPC with that ID not found")
+    fingerprint = npcs.get_corpus_fingerprint(db, npc_id=job.npc_id)
+    return training.submit(job.npc_id, fingerprint)
+
+# get all training jobs
+
+
+@app.get("/training/jobs/", response_model=list[schemas.TrainingJob])
+def read_training_jobs():
+    return training.get_jobs()
+
+# get training job status & progress by ID
+
+
+@app.get("/training/jobs/{job_id}", response_model=schemas.TrainingJob)
+def read_training_job(job_id: str):
+    job = training.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Training job not found")
+    return job
+
+# cancel training job by ID
+
+
+@app.delete("/training/jobs/{job_id}", response_model=schemas.TrainingJob)
+def cancel_training_job(job_id: str):
+    job = training.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Training job not found")
+    return training.cancel(job)
+
+
+# NOTE: Get Microsoft Azure Text-To-Speech (or the cached rendering of the same line); stream it as it arrives:
 
 @app.post("/chat/voice")
-def get_voice(voice_name: str, text: str, style: str):
-    filename = "output.mp3"
-
-    # Delete existing audio file with the same to free up memory.
-    if os.path.exists(filename):
-        os.remove(filename)
-
-    url = "https://australiaeast.tts.speech.microsoft.com/cognitiveservices/v1"
-    headers = {
-        "Content-Type": "application/ssml+xml",
-        "Authorization": "Bearer [Base64 access_token]",
-        "X-Microsoft-OutputFormat": "audio-24khz-160kbitrate-mono-mp3",
-        "Ocp-Apim-Subscription-Key": API_KEY,
-        "User-Agent": "NPC-Creator",
-        "Host": "australiaeast.tts.speech.microsoft.com"
-    }
-    body = f"""<?xml version="1.0" encoding="utf-8"?>
-    <speak version="1.0" xmlns="http://www.w3.org/2001/10/synthesis" xmlns:mstts="https://www.w3.org/2001/mstts" xml:lang="en-GB">
-        <voice name="{voice_name}">
-            <mstts:express-as style="{style}" styledegree="2">{text}</mstts:express-as>
-        </voice>
-    </speak>"""
+async def get_voice(voice_name: str, text: str, style: str):
+    try:
+        audio_stream = await tts.stream_voice(voice_name, text, style)
+    except tts.TTSError as error:
+        raise HTTPException(status_code=error.status_code, detail=error.detail)
+    return StreamingResponse(audio_stream, media_type="audio/mpeg")
+
 
+# persistent chat session with one NPC over a WebSocket. Each text message is a
+# sentence; the reply comes back as {"type": "text", ...} as soon as it is known,
+# followed (unless audio=false) by the reply's audio as binary mp3 chunks and
+# {"type": "audio_end"}. The NPC and its model stay bound to the connection.
+
+
+@app.websocket("/chat/ws/{npc_id}")
+async def chat_session(websocket: WebSocket, npc_id: int, audio: bool = True):
+    await websocket.accept()
+    session = chat_sessions.ChatSession(npc_id)
     try:
-        response = requests.post(url, headers=headers, data=body.encode())
-        response.raise_for_status()
-    except requests.exceptions.HTTPError as error:
+        try:
+            bound = await run_in_threadpool(chat_sessions.run, session.bind)
+        except training.TrainingFailed as error:
+            # binding trains a never-trained NPC first, like /chat/ (503 there)
+            await websocket.send_json({"type": "error", "detail": str(error)})
+            await websocket.close(code=1011, reason="Training failed")
+            return
+        if not bound:
+            await websocket.close(code=4404, reason="NPC with that ID not found")
+            return
+
+        while True:
+            sentence = await websocket.receive_text()
+            try:
+                response = await run_in_threadpool(chat_sessions.run, session.reply, sentence)
+            except training.TrainingFailed as error:
+                await websocket.send_json({"type": "error", "detail": str(error)})
+                continue
+            if response is None:
+                await websocket.close(code=4404, reason="NPC with that ID not found")
+                return
+            await websocket.send_json({"type": "text", "sentence": sentence, "response": response})
+
+            if audio:
+                try:
+                    async for chunk in await tts.stream_voice(session.voice, response, session.style):
+                        await websocket.send_bytes(chunk)
+                except tts.TTSError as error:
+                    await websocket.send_json({"type": "error", "detail": error.detail})
+                    continue
+                except httpx.HTTPError as error:
+                    await websocket.send_json({"type": "error", "detail": f"Text-to-speech failed: {error}"})
+                    continue
+                await websocket.send_json({"type": "audio_end"})
+    except WebSocketDisconnect:
+        pass
+
+
+# Async endpoint variants: the same read endpoints served from the async
+# database session, so idle clients don't tie up the worker threadpool. Each one runs its
+# sync endpoint on the async connection, so both share the snapshots, the response cache
+# and the serializers and can't answer differently.
+
+
+async def run_endpoint(db: AsyncSession, endpoint, *args, **kwargs):
+    return await db.run_sync(lambda sync_db: endpoint(*args, db=sync_db, **kwargs))
+
+
+@app.get("/async/users/", response_model=list[schemas.User])
+async def read_users_async(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None,
+                           include_total: bool = False, db: AsyncSession = Depends(get_async_read_db)):
+    return await run_endpoint(db, read_users, response, skip, limit, cursor, include_total)
+
+
+@app.get("/async/users/{user_id}", response_model=schemas.User)
+async def read_user_async(user_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    return await run_endpoint(db, read_user, user_id)
+
+
+@app.get("/async/projects/", response_model=list[schemas.Project])
+async def read_projects_async(request: Request, skip: int = 0, limit: int = 100, cursor: Optional[str] = None,
+                              include_total: bool = False, db: AsyncSession = Depends(get_async_db)):
+    return await run_endpoint(db, read_projects, request, skip, limit, cursor, include_total)
+
+
+@app.get("/async/intents/", response_model=list[schemas.Intent])
+async def read_intents_async(request: Request, skip: int = 0, limit: int = 100, cursor: Optional[str] = None,
+                             include_total: bool = False, db: AsyncSession = Depends(get_async_db)):
+    return await run_endpoint(db, read_intents, request, skip, limit, cursor, include_total)
+
+
+@app.get("/async/npcs/", response_model=list[schemas.NPC])
+async def read_npcs_async(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None,
+                          include_total: bool = False, db: AsyncSession = Depends(get_async_read_db)):
+    return await run_endpoint(db, read_npcs, response, skip, limit, cursor, include_total)
+
+
+@app.get("/async/npcs/{npc_id}/", response_model=schemas.NPC)
+async def get_npc_async(request: Request, npc_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    return await run_endpoint(db, get_npc, request, npc_id)
+
+
+@app.get("/async/npcs/intents/{npc_id}/")
+async def get_npc_intents_async(request: Request, npc_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    return await run_endpoint(db, get_npc_intents, request, npc_id)
+
+
+# check the NPC or project a search is scoped to exists
+
+
+def check_search_scope(db: Session, npc_id: Optional[int], project_id: Optional[int]):
+    if npc_id is not None and not npcs.get_existing_npc_ids(db, [npc_id]):
+        raise HTTPException(
+            status_code=404, detail="NPC with that ID not found")
+    if project_id is not None and not projects.project_exists(db, project_id):
         raise HTTPException(
-            status_code=error.response.status_code, detail=error.response.text)
-
-    # Save audio file
-    with open(filename, "wb") as f:
-        f.write(response.content)
-
-    # Play audio file
-    audio = AudioSegment.from_file(filename, format="mp3")
-    play(audio)
-
-    # Return audio file as a streaming response
-    def audio_stream():
-        with open(filename, "rb") as f:
-            while True:
-                audio_chunk = f.read(8192)
-                if not audio_chunk:
-                    break
-                yield audio_chunk
-
-    return StreamingResponse(audio_stream(), media_type="audio/mpeg")
+            status_code=404, detail="Project with that ID not found")
+
+# full-text search over pattern and response texts, best match first
+
+
+@app.get("/search", response_model=list[schemas.SearchHit])
+def search_texts(q: str, npc_id: Optional[int] = None, project_id: Optional[int] = None,
+                 kind: Optional[str] = None, limit: int = Query(20, ge=1, le=100),
+                 db: Session = Depends(get_read_db)):
+    if kind not in (None, "pattern", "response"):
+        raise HTTPException(
+            status_code=400, detail="Kind must be 'pattern' or 'response'")
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Query must not be empty")
+    check_search_scope(db, npc_id, project_id)
+    return search.search(db, q, npc_id=npc_id, project_id=project_id, kind=kind, limit=limit)
+
+# pattern texts used by more than one intent
+
+
+@app.get("/search/duplicates", response_model=list[schemas.DuplicatePattern])
+def search_duplicates(npc_id: Optional[int] = None, project_id: Optional[int] = None,
+                      db: Session = Depends(get_read_db)):
+    check_search_scope(db, npc_id, project_id)
+    return search.duplicates(db, npc_id=npc_id, project_id=project_id)
+
+
+# hit/miss stats of the GET response cache
+@app.get("/cache/responses")
+def get_response_cache_stats():
+    return response_cache.stats()
+
+
+# hit/miss stats of the on-disk text-to-speech audio cache
+@app.get("/chat/voice/cache")
+def get_voice_cache_stats():
+    return tts_cache.audio.stats()
+
+
+# request latency, stage and SQL histograms plus cache stats, in Prometheus text format
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    return PlainTextResponse(metrics.render({
+        "model_cache": model_cache.models.stats(),
+        "pattern_index": pattern_index.indexes.stats(),
+        "response_cache": response_cache.stats(),
+        "tts_cache": tts_cache.audio.stats(),
+    }), media_type="text/plain; version=0.0.4")
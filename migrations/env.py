@@ -0,0 +1,39 @@
+from logging.config import fileConfig
+from alembic import context
+from sqlalchemy import create_engine, pool
+from database.database import SQLALCHEMY_DATABASE_URL
+from database import models
+
+# Alembic environment: migrates the database of DATABASE_URL, or of sqlalchemy.url when set
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+target_metadata = models.Base.metadata
+url = config.get_main_option("sqlalchemy.url") or SQLALCHEMY_DATABASE_URL
+
+# SQLite can't alter constraints in place, so its migrations copy and rebuild tables
+render_as_batch = url.startswith("sqlite")
+
+
+def run_migrations_offline():
+    context.configure(url=url, target_metadata=target_metadata, literal_binds=True,
+                      dialect_opts={"paramstyle": "named"}, render_as_batch=render_as_batch)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    connectable = create_engine(url, poolclass=pool.NullPool)
+    with connectable.connect() as connection:
+        context.configure(connection=connection, target_metadata=target_metadata,
+                          render_as_batch=render_as_batch)
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,100 @@
+"""baseline: the schema created by models.Base.metadata.create_all before migrations
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'users',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('email', sa.String()),
+        sa.Column('password', sa.String()),
+    )
+    op.create_index('ix_users_id', 'users', ['id'])
+    op.create_index('ix_users_email', 'users', ['email'], unique=True)
+
+    op.create_table(
+        'projects',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('name', sa.String()),
+        sa.Column('description', sa.String()),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id')),
+    )
+    op.create_index('ix_projects_id', 'projects', ['id'])
+    op.create_index('ix_projects_name', 'projects', ['name'])
+    op.create_index('ix_projects_description', 'projects', ['description'])
+
+    op.create_table(
+        'intents',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('tag', sa.String()),
+    )
+    op.create_index('ix_intents_id', 'intents', ['id'])
+    op.create_index('ix_intents_tag', 'intents', ['tag'])
+
+    for table in ('patterns', 'responses'):
+        op.create_table(
+            table,
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('text', sa.String()),
+            sa.Column('intent_id', sa.Integer(), sa.ForeignKey('intents.id')),
+        )
+        op.create_index(f'ix_{table}_id', table, ['id'])
+        op.create_index(f'ix_{table}_text', table, ['text'])
+
+    op.create_table(
+        'npcs',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('name', sa.String()),
+        sa.Column('avatar', sa.String()),
+        sa.Column('bio', sa.String()),
+        sa.Column('voice', sa.String()),
+        sa.Column('style', sa.String()),
+        sa.Column('project_id', sa.Integer(), sa.ForeignKey('projects.id')),
+    )
+    op.create_index('ix_npcs_id', 'npcs', ['id'])
+    for column in ('name', 'avatar', 'bio', 'voice', 'style'):
+        op.create_index(f'ix_npcs_{column}', 'npcs', [column])
+
+    op.create_table(
+        'project_npcs',
+        sa.Column('project_id', sa.Integer(), sa.ForeignKey('projects.id')),
+        sa.Column('npc_id', sa.Integer(), sa.ForeignKey('npcs.id')),
+    )
+    op.create_table(
+        'npc_intents',
+        sa.Column('npc_id', sa.Integer(), sa.ForeignKey('npcs.id')),
+        sa.Column('intent_id', sa.Integer(), sa.ForeignKey('intents.id')),
+    )
+
+    op.create_table(
+        'npc_models',
+        sa.Column('npc_id', sa.Integer(), sa.ForeignKey('npcs.id'), primary_key=True),
+        sa.Column('fingerprint', sa.String()),
+    )
+    op.create_table(
+        'npc_snapshots',
+        sa.Column('npc_id', sa.Integer(), sa.ForeignKey('npcs.id'), primary_key=True),
+        sa.Column('npc_body', sa.LargeBinary()),
+        sa.Column('npc_etag', sa.String()),
+        sa.Column('intents_body', sa.LargeBinary()),
+        sa.Column('intents_etag', sa.String()),
+    )
+
+
+def downgrade():
+    for table in ('npc_snapshots', 'npc_models', 'npc_intents', 'project_npcs', 'npcs',
+                  'responses', 'patterns', 'intents', 'projects', 'users'):
+        op.drop_table(table)
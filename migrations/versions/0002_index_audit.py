@@ -0,0 +1,84 @@
+"""index audit: keyed association tables, foreign key indexes, no free-text indexes
+
+The association tables get composite primary keys (deduplicating existing links) and an
+index on their second column for reverse lookups. The foreign keys read on every tree load
+get indexes, and the B-tree indexes on free-text columns, which no query filters on, are
+dropped.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+TEXT_INDEXES = [
+    ('npcs', 'avatar'),
+    ('npcs', 'bio'),
+    ('npcs', 'voice'),
+    ('npcs', 'style'),
+    ('projects', 'description'),
+    ('patterns', 'text'),
+    ('responses', 'text'),
+]
+
+FOREIGN_KEY_INDEXES = [
+    ('projects', 'user_id'),
+    ('patterns', 'intent_id'),
+    ('responses', 'intent_id'),
+]
+
+# (table, first column, its table, second column, its table)
+ASSOCIATION_TABLES = [
+    ('project_npcs', 'project_id', 'projects', 'npc_id', 'npcs'),
+    ('npc_intents', 'npc_id', 'npcs', 'intent_id', 'intents'),
+]
+
+
+# copy the distinct, complete links into a new table and swap it in; a keyed table
+# can't hold the duplicate or half-empty rows the unkeyed one may have collected
+def rebuild_association_table(table, first, first_table, second, second_table, keyed):
+    columns = [
+        sa.Column(first, sa.Integer(), sa.ForeignKey(f'{first_table}.id'), nullable=not keyed),
+        sa.Column(second, sa.Integer(), sa.ForeignKey(f'{second_table}.id'), nullable=not keyed),
+    ]
+    if keyed:
+        columns.append(sa.PrimaryKeyConstraint(first, second, name=f'pk_{table}'))
+    op.create_table(f'{table}_rebuild', *columns)
+
+    select = f'SELECT DISTINCT {first}, {second} FROM {table}'
+    if keyed:
+        select += f' WHERE {first} IS NOT NULL AND {second} IS NOT NULL'
+    op.execute(f'INSERT INTO {table}_rebuild ({first}, {second}) {select}')
+    op.drop_table(table)
+    op.rename_table(f'{table}_rebuild', table)
+
+
+def upgrade():
+    for table, first, first_table, second, second_table in ASSOCIATION_TABLES:
+        rebuild_association_table(table, first, first_table, second, second_table, keyed=True)
+        op.create_index(f'ix_{table}_{second}', table, [second])
+
+    for table, column in FOREIGN_KEY_INDEXES:
+        op.create_index(f'ix_{table}_{column}', table, [column])
+
+    for table, column in TEXT_INDEXES:
+        op.drop_index(f'ix_{table}_{column}', table_name=table)
+
+
+def downgrade():
+    for table, column in TEXT_INDEXES:
+        op.create_index(f'ix_{table}_{column}', table, [column])
+
+    for table, column in FOREIGN_KEY_INDEXES:
+        op.drop_index(f'ix_{table}_{column}', table_name=table)
+
+    for table, first, first_table, second, second_table in ASSOCIATION_TABLES:
+        rebuild_association_table(table, first, first_table, second, second_table, keyed=False)
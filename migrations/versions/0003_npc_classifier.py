@@ -0,0 +1,29 @@
+"""npc classifier: per-NPC choice of intent classifier backend
+
+Existing NPCs keep the NpcTrainerAI chatbot. Their snapshots are dropped, since the
+serialized NPC now includes the classifier; they are rebuilt on first read.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('npcs', sa.Column('classifier', sa.String(), server_default='chatbot'))
+    op.execute('DELETE FROM npc_snapshots')
+
+
+def downgrade():
+    with op.batch_alter_table('npcs') as batch_op:
+        batch_op.drop_column('classifier')
+    op.execute('DELETE FROM npc_snapshots')
@@ -0,0 +1,39 @@
+"""snapshot backfill: build the snapshot of every NPC that has none
+
+Snapshots used to be built on the first read of an NPC stored before they existed (or
+dropped by 0003); reads now only ever read them.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+BATCH = 500
+
+
+def upgrade():
+    from database import models
+    from services import snapshots
+
+    db = Session(bind=op.get_bind())
+    npc_ids = db.execute(
+        select(models.NPC.id).outerjoin(models.NPCSnapshot)
+        .where(models.NPCSnapshot.npc_id.is_(None)).order_by(models.NPC.id)).scalars().all()
+    for start in range(0, len(npc_ids), BATCH):
+        snapshots.refresh(db, npc_ids[start:start + BATCH])
+        db.flush()
+    db.close()
+
+
+def downgrade():
+    pass
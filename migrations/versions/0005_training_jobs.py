@@ -0,0 +1,39 @@
+"""training jobs: chatbot training jobs stored in the database
+
+Jobs used to live in the memory of the worker that submitted them, so two workers could
+train the same NPC at once and only the submitting worker could report or cancel a job.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'training_jobs',
+        sa.Column('id', sa.String(), primary_key=True),
+        sa.Column('npc_id', sa.Integer()),
+        sa.Column('fingerprint', sa.String()),
+        sa.Column('state', sa.String()),
+        sa.Column('active_npc_id', sa.Integer(), unique=True),
+        sa.Column('error', sa.String()),
+        sa.Column('created_at', sa.Float()),
+        sa.Column('started_at', sa.Float()),
+        sa.Column('finished_at', sa.Float()),
+    )
+    op.create_index('ix_training_jobs_npc_id', 'training_jobs', ['npc_id'])
+
+
+def downgrade():
+    op.drop_index('ix_training_jobs_npc_id', table_name='training_jobs')
+    op.drop_table('training_jobs')
@@ -63,6 +63,7 @@ class NPCBase(BaseModel):
     bio: str
     voice: str
     style: str
+    classifier: str = "chatbot"
     intents: list[Intent] = []
 
 
@@ -147,3 +148,68 @@ class ProjectNPC(ProjectNPCBase):
 
     class Config:
         orm_mode = True
+
+
+class TrainingJobCreate(BaseModel):
+    npc_id: int
+
+
+class TrainingJob(BaseModel):
+    id: str
+    npc_id: int
+    fingerprint: str
+    status: str
+    progress: float
+    error: Optional[str] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    class Config:
+        orm_mode = True
+
+
+class ChatItem(BaseModel):
+    npc_id: int
+    sentence: str
+
+
+class ChatRequest(ChatItem):
+    # deprecated and ignored: the server retrains by itself whenever the NPC's intent corpus changes
+    training_required: Optional[bool] = None
+
+
+class ChatReply(ChatItem):
+    response: str
+
+
+class IntentImportError(BaseModel):
+    index: int
+    tag: Optional[str] = None
+    detail: str
+
+
+class IntentImportReport(BaseModel):
+    intents: int
+    patterns: int
+    responses: int
+    errors: list[IntentImportError] = []
+
+
+class SearchHit(BaseModel):
+    intent_id: int
+    tag: Optional[str] = None
+    kind: str
+    id: int
+    text: str
+    score: float
+
+
+class IntentRef(BaseModel):
+    id: int
+    tag: Optional[str] = None
+
+
+class DuplicatePattern(BaseModel):
+    text: str
+    intents: list[IntentRef]
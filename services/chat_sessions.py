@@ -0,0 +1,56 @@
+from sqlalchemy.orm import Session
+from database import models
+from database.database import SessionLocal
+from services import npcs, pattern_index, snapshots
+
+# a player's chat session with one NPC: the NPC's voice, pattern index and classifier are
+# looked up once per connection and reused for every sentence. Each sentence only checks
+# two keys (the NPC snapshot etag and the trained model fingerprint) and rebinds when
+# either changed, i.e. after the NPC was edited or its model retrained.
+
+
+class ChatSession:
+    def __init__(self, npc_id: int):
+        self.npc_id = npc_id
+        self.voice = None
+        self.style = None
+        self.version = None
+        self.patterns = None
+        self.classifier = None
+
+    def _version(self, db: Session):
+        return (snapshots.get_npc_etag(db, self.npc_id),
+                npcs.get_trained_fingerprint(db, self.npc_id))
+
+    # load the NPC into the session; False when it doesn't exist
+    def bind(self, db: Session):
+        row = db.query(models.NPC.voice, models.NPC.style).filter(
+            models.NPC.id == self.npc_id).first()
+        if row is None:
+            return False
+        self.voice, self.style = row
+        self.patterns = pattern_index.indexes.get(db, self.npc_id)
+        self.classifier = npcs.get_classifier(db, self.npc_id)
+        # read after binding: binding may have trained the NPC's first model
+        self.version = self._version(db)
+        return True
+
+    # the NPC's reply to sentence, or None when the NPC was deleted mid-session
+    def reply(self, db: Session, sentence: str):
+        if self._version(db) != self.version and not self.bind(db):
+            return None
+
+        response = self.patterns.match(sentence) if self.patterns else None
+        pattern_index.indexes.count([response])
+        if response is None:
+            response = self.classifier.get_response(sentence)
+        return "Sorry, I don't understand..." if response == None else response
+
+
+# call function(db, *args) with a short-lived session, from a worker thread
+def run(function, *args):
+    db = SessionLocal()
+    try:
+        return function(db, *args)
+    finally:
+        db.close()
@@ -0,0 +1,200 @@
+import json
+import os
+import random
+import shutil
+import tempfile
+from collections import Counter
+import numpy as np
+from dotenv import load_dotenv
+from services.text import tokenize
+
+# built-in intent classifier for NPCs with small corpora: TF-IDF vectors of the patterns,
+# cosine similarity against each sentence, best pattern per intent wins. Trains in a few
+# milliseconds straight from the NPC's intents, no external model involved.
+#
+# Trained models are saved under TFIDF_MODEL_DIR as flat .npy arrays next to a JSON header
+# (vocabulary and responses) and memory-mapped read-only when loaded, so every worker
+# process serving an NPC shares one copy of its weights through the page cache.
+
+load_dotenv()
+TFIDF_THRESHOLD = float(os.getenv("TFIDF_THRESHOLD", "0.4"))
+# empty keeps models in process memory only
+MODEL_DIR = os.getenv("TFIDF_MODEL_DIR", ".models/tfidf")
+FORMAT_VERSION = 1
+ARRAYS = ("starts", "idf", "indices", "data", "indptr")
+
+
+class TfidfClassifier:
+    def __init__(self, intents: list, threshold: float = TFIDF_THRESHOLD):
+        self.threshold = threshold
+        self.vocabulary = {}
+        self.responses = []
+        starts = []
+        rows, columns, counts = [], [], []
+
+        row = 0
+        for intent in intents:
+            patterns = [tokens for tokens in map(tokenize, intent["patterns"]) if tokens]
+            if not patterns:
+                continue
+            # each intent's patterns are consecutive rows, starting at starts[class]
+            starts.append(row)
+            self.responses.append(intent["responses"])
+            for tokens in patterns:
+                for token, count in Counter(tokens).items():
+                    rows.append(row)
+                    columns.append(self.vocabulary.setdefault(token, len(self.vocabulary)))
+                    counts.append(count)
+                row += 1
+
+        self.patterns = row
+        self.starts = np.array(starts, dtype=np.int64)
+        rows = np.array(rows, dtype=np.int64)
+        columns = np.array(columns, dtype=np.int64)
+        document_frequency = np.bincount(columns, minlength=len(self.vocabulary))
+        self.idf = (np.log((1 + self.patterns) / (1 + document_frequency)) + 1).astype(np.float32)
+
+        weights = np.array(counts, dtype=np.float32) * self.idf[columns]
+        norms = np.sqrt(np.bincount(rows, weights * weights, minlength=self.patterns))
+        weights /= norms[rows]
+
+        # compressed sparse columns: the patterns containing term t are
+        # indices[indptr[t]:indptr[t + 1]], with their weights in data
+        order = np.argsort(columns, kind="stable")
+        self.indices = rows[order]
+        self.data = weights[order].astype(np.float32)
+        self.indptr = np.zeros(len(self.vocabulary) + 1, dtype=np.int64)
+        np.cumsum(document_frequency, out=self.indptr[1:])
+
+    # write the model to directory (created, must not exist yet)
+    def save(self, directory: str):
+        os.makedirs(directory)
+        for name in ARRAYS:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+        # the vocabulary in column order, so the header is a plain list
+        vocabulary = sorted(self.vocabulary, key=self.vocabulary.get)
+        with open(os.path.join(directory, "header.json"), "w") as f:
+            json.dump({"format": FORMAT_VERSION, "patterns": self.patterns,
+                       "vocabulary": vocabulary, "responses": self.responses}, f)
+
+    # a saved model; its arrays are memory-mapped read-only unless mmap is False
+    @classmethod
+    def load(cls, directory: str, threshold: float = TFIDF_THRESHOLD, mmap: bool = True):
+        with open(os.path.join(directory, "header.json")) as f:
+            header = json.load(f)
+        if header["format"] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported TF-IDF model format {header['format']}")
+
+        classifier = cls.__new__(cls)
+        classifier.threshold = threshold
+        classifier.patterns = header["patterns"]
+        classifier.vocabulary = {token: column for column, token in enumerate(header["vocabulary"])}
+        classifier.responses = header["responses"]
+        for name in ARRAYS:
+            setattr(classifier, name, np.load(os.path.join(directory, f"{name}.npy"),
+                                              mmap_mode="r" if mmap else None))
+        return classifier
+
+    # (sentences x intents) best cosine similarity of each sentence to each intent's patterns
+    def scores(self, sentences: list[str]):
+        if not self.patterns:
+            return np.zeros((len(sentences), 0), dtype=np.float32)
+
+        # words never seen in a pattern still count towards the sentence's length,
+        # with the idf of a term in no document, so "the weather is nice" isn't "the is"
+        unseen_idf = np.log(1 + self.patterns) + 1
+        unseen = np.zeros(len(sentences), dtype=np.float32)
+        query_rows, query_columns, query_counts = [], [], []
+        for index, sentence in enumerate(sentences):
+            for token, count in Counter(tokenize(sentence)).items():
+                column = self.vocabulary.get(token)
+                if column is None:
+                    unseen[index] += (count * unseen_idf) ** 2
+                else:
+                    query_rows.append(index)
+                    query_columns.append(column)
+                    query_counts.append(count)
+        query_rows = np.array(query_rows, dtype=np.int64)
+        query_columns = np.array(query_columns, dtype=np.int64)
+        query_weights = np.array(query_counts, dtype=np.float32) * self.idf[query_columns]
+        norms = np.sqrt(np.bincount(query_rows, query_weights * query_weights,
+                                    minlength=len(sentences)) + unseen)
+        query_weights /= np.where(norms > 0, norms, 1)[query_rows]
+
+        # gather every (sentence, pattern) product of the sentences' terms in one pass
+        lengths = self.indptr[query_columns + 1] - self.indptr[query_columns]
+        offsets = np.repeat(self.indptr[query_columns] - (np.cumsum(lengths) - lengths), lengths)
+        positions = offsets + np.arange(lengths.sum())
+        products = self.data[positions] * np.repeat(query_weights, lengths)
+        cells = np.repeat(query_rows, lengths) * self.patterns + self.indices[positions]
+        similarity = np.bincount(cells, products, minlength=len(sentences) * self.patterns)
+        similarity = similarity.reshape(len(sentences), self.patterns)
+        return np.maximum.reduceat(similarity, self.starts, axis=1)
+
+    # a response per sentence, None when no intent is similar enough
+    def get_responses(self, sentences: list[str]):
+        if not sentences:
+            return []
+        scores = self.scores(sentences)
+        if not scores.shape[1]:
+            return [None] * len(sentences)
+
+        best = scores.argmax(axis=1)
+        confidence = scores[np.arange(len(sentences)), best]
+        responses = []
+        for intent, score in zip(best, confidence):
+            candidates = self.responses[intent]
+            responses.append(random.choice(candidates)
+                             if score >= self.threshold and candidates else None)
+        return responses
+
+    def get_response(self, sentence: str):
+        return self.get_responses([sentence])[0]
+
+
+def _model_path(npc_id: int, version: str):
+    # versions are ETags, quotes included
+    version = version.strip('"')
+    return os.path.join(MODEL_DIR, f"{npc_id}-{version}")
+
+
+# the NPC's classifier for a version of its intents: mapped from MODEL_DIR when a worker
+# already saved it, otherwise trained from intents() and saved for the other workers
+def get_classifier(npc_id: int, version: str, intents):
+    if not MODEL_DIR:
+        return TfidfClassifier(intents())
+
+    path = _model_path(npc_id, version)
+    try:
+        return TfidfClassifier.load(path)
+    except (OSError, ValueError, KeyError):
+        pass
+
+    classifier = TfidfClassifier(intents())
+    try:
+        os.makedirs(MODEL_DIR, exist_ok=True)
+        # save to a scratch directory and rename it into place, so a model is never
+        # read half-written; when two workers race, the first rename wins
+        scratch = tempfile.mkdtemp(dir=MODEL_DIR, prefix=".tmp-")
+        classifier.save(os.path.join(scratch, "model"))
+        try:
+            os.rename(os.path.join(scratch, "model"), path)
+        except OSError:
+            pass
+        shutil.rmtree(scratch, ignore_errors=True)
+        remove_models(npc_id, keep=version)
+        return TfidfClassifier.load(path)
+    except (OSError, ValueError, KeyError):
+        # an unwritable model directory only costs the sharing
+        return classifier
+
+
+# delete the NPC's saved models (but the keep version); processes that mapped them keep
+# their pages until they let go of the model
+def remove_models(npc_id: int, keep: str = None):
+    if not MODEL_DIR or not os.path.isdir(MODEL_DIR):
+        return
+    kept = os.path.basename(_model_path(npc_id, keep)) if keep else None
+    for name in os.listdir(MODEL_DIR):
+        if name.startswith(f"{npc_id}-") and name != kept:
+            shutil.rmtree(os.path.join(MODEL_DIR, name), ignore_errors=True)
@@ -0,0 +1,92 @@
+import itertools
+import json
+from sqlalchemy import select
+from database.database import ReadSessionLocal
+from database import models
+
+# streaming export of NPC training corpora, written row by row from server-side cursors
+
+STREAM_BATCH = 1000
+
+
+def _stream(db, statement):
+    return db.execute(statement.execution_options(yield_per=STREAM_BATCH))
+
+
+# yield (intent_id, [texts]) from rows ordered by intent_id
+def _grouped(rows):
+    for intent_id, group in itertools.groupby(rows, key=lambda row: row[0]):
+        yield intent_id, [text for _, text in group]
+
+
+# the texts of intent_id from a cursor of groups positioned at group, and the cursor's
+# next group. Groups of intents the intents cursor never returned (orphan rows, or rows
+# inserted between the cursors' reads) are skipped so they can't stall the merge
+def _take_group(groups, group, intent_id: int):
+    while group is not None and group[0] < intent_id:
+        group = next(groups, None)
+    if group is not None and group[0] == intent_id:
+        return group[1], next(groups, None)
+    return [], group
+
+
+# yield one intent dict at a time for an NPC, merging three ordered cursors
+# (intents, patterns, responses) so only the current intent is held in memory
+def iter_npc_intents(db, npc_id: int):
+    npc_intent_ids = select(models.NPCIntent.c.intent_id).where(
+        models.NPCIntent.c.npc_id == npc_id)
+    intent_rows = _stream(db, select(models.Intent.id, models.Intent.tag).where(
+        models.Intent.id.in_(npc_intent_ids)).order_by(models.Intent.id))
+    pattern_groups = _grouped(_stream(db, select(models.Pattern.intent_id, models.Pattern.text).where(
+        models.Pattern.intent_id.in_(npc_intent_ids)).order_by(models.Pattern.intent_id, models.Pattern.id)))
+    response_groups = _grouped(_stream(db, select(models.Response.intent_id, models.Response.text).where(
+        models.Response.intent_id.in_(npc_intent_ids)).order_by(models.Response.intent_id, models.Response.id)))
+
+    pattern_group = next(pattern_groups, None)
+    response_group = next(response_groups, None)
+    for intent_id, tag in intent_rows:
+        patterns, pattern_group = _take_group(pattern_groups, pattern_group, intent_id)
+        responses, response_group = _take_group(response_groups, response_group, intent_id)
+        yield {"id": intent_id, "tag": tag, "patterns": patterns, "responses": responses}
+
+
+def iter_project_intents(db, project_id: int):
+    npc_ids = db.execute(select(models.ProjectNPC.c.npc_id).where(
+        models.ProjectNPC.c.project_id == project_id).order_by(models.ProjectNPC.c.npc_id)).scalars().all()
+    for npc_id in npc_ids:
+        for intent in iter_npc_intents(db, npc_id):
+            yield {"npc_id": npc_id, **intent}
+
+
+# encode intents as NDJSON lines or as one intents.json document, a row at a time
+def _encode(intents, file_format: str):
+    if file_format == "ndjson":
+        for intent in intents:
+            yield json.dumps(intent) + "\n"
+        return
+
+    yield '{"intents": ['
+    for index, intent in enumerate(intents):
+        yield ("," if index else "") + "\n" + json.dumps(intent)
+    yield "\n]}\n"
+
+
+# the export outlives the request's session, so it opens its own
+def _export(iter_intents, owner_id: int, file_format: str):
+    db = ReadSessionLocal()
+    try:
+        yield from _encode(iter_intents(db, owner_id), file_format)
+    finally:
+        db.close()
+
+
+def stream_npc_corpus(npc_id: int, file_format: str = "ndjson"):
+    return _export(iter_npc_intents, npc_id, file_format)
+
+
+def stream_project_corpus(project_id: int, file_format: str = "ndjson"):
+    return _export(iter_project_intents, project_id, file_format)
+
+
+def media_type(file_format: str):
+    return "application/x-ndjson" if file_format == "ndjson" else "application/json"
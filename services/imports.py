@@ -0,0 +1,202 @@
+import argparse
+import io
+import json
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from database import models
+from services import response_cache, search
+
+# bulk intent import: stream-parse an intents file and insert it in batches inside one transaction
+
+BATCH_SIZE = 1000
+READ_SIZE = 64 * 1024
+
+
+# yield the intents of a standard intents.json file ({"intents": [...]} or a bare list)
+# one object at a time, without reading the whole file into memory
+def iter_json_intents(f):
+    decoder = json.JSONDecoder()
+    buffer = ""
+    eof = False
+
+    def fill():
+        nonlocal buffer, eof
+        chunk = f.read(READ_SIZE)
+        if not chunk:
+            eof = True
+        buffer += chunk
+
+    # find the opening bracket of the intents array
+    while True:
+        stripped = buffer.lstrip()
+        if stripped.startswith("["):
+            position = buffer.index("[") + 1
+            break
+        key = buffer.find('"intents"')
+        start = buffer.find("[", key) if key != -1 else -1
+        if start != -1:
+            position = start + 1
+            break
+        if eof:
+            raise ValueError("No intents array found")
+        fill()
+
+    while True:
+        # skip separators between objects
+        while position < len(buffer) and buffer[position] in " \t\r\n,":
+            position += 1
+        if position == len(buffer):
+            if eof:
+                raise ValueError("Unterminated intents array")
+            buffer = buffer[position:]
+            position = 0
+            fill()
+            continue
+        if buffer[position] == "]":
+            return
+
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            buffer = buffer[position:]
+            position = 0
+            fill()
+            continue
+        yield item
+        position = end
+
+
+# yield one intent per non-blank line of an NDJSON file; a malformed line
+# yields its error so the remaining lines still import
+def iter_ndjson_intents(f):
+    for line in f:
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as error:
+                yield ValueError(f"invalid JSON: {error}")
+
+
+# accept both the intents.json shape ("hello") and the API shape ({"text": "hello"})
+def _texts(values):
+    if not isinstance(values, list):
+        raise ValueError("expected a list")
+    texts = []
+    for value in values:
+        if isinstance(value, dict):
+            value = value.get("text")
+        if not isinstance(value, str):
+            raise ValueError("expected strings or {\"text\": ...} objects")
+        texts.append(value)
+    return texts
+
+
+def _parse_intent(item):
+    if isinstance(item, ValueError):
+        raise item
+    if not isinstance(item, dict):
+        raise ValueError("intent must be an object")
+    tag = item.get("tag")
+    if not isinstance(tag, str) or not tag:
+        raise ValueError("intent needs a non-empty tag")
+    return tag, _texts(item.get("patterns", [])), _texts(item.get("responses", []))
+
+
+def _insert_batch(db: Session, batch, report, seen_tags):
+    tags = [tag for _, tag, _, _ in batch]
+    existing = {tag for (tag,) in db.query(models.Intent.tag).filter(
+        models.Intent.tag.in_(tags))}
+
+    new_intents = []
+    for index, tag, patterns, responses in batch:
+        if tag in existing:
+            report["errors"].append(
+                {"index": index, "tag": tag, "detail": "Intent with that tag already exists"})
+        elif tag in seen_tags:
+            report["errors"].append(
+                {"index": index, "tag": tag, "detail": "Duplicate tag in import file"})
+        else:
+            seen_tags.add(tag)
+            new_intents.append((models.Intent(tag=tag), patterns, responses))
+    if not new_intents:
+        return
+
+    db.add_all([db_intent for db_intent, _, _ in new_intents])
+    db.flush()
+
+    pattern_rows = [{"text": text, "intent_id": db_intent.id}
+                    for db_intent, patterns, _ in new_intents for text in patterns]
+    response_rows = [{"text": text, "intent_id": db_intent.id}
+                     for db_intent, _, responses in new_intents for text in responses]
+    if pattern_rows:
+        db.execute(insert(models.Pattern), pattern_rows)
+    if response_rows:
+        db.execute(insert(models.Response), response_rows)
+
+    report["intents"] += len(new_intents)
+    report["patterns"] += len(pattern_rows)
+    report["responses"] += len(response_rows)
+
+
+# import every intent of a text stream; bad or duplicate items are reported, not fatal
+def import_intents(db: Session, f, file_format: str = "json"):
+    items = iter_ndjson_intents(f) if file_format == "ndjson" else iter_json_intents(f)
+    report = {"intents": 0, "patterns": 0, "responses": 0, "errors": []}
+    seen_tags = set()
+    batch = []
+
+    try:
+        for index, item in enumerate(items):
+            try:
+                tag, patterns, responses = _parse_intent(item)
+            except ValueError as error:
+                report["errors"].append({"index": index, "tag": None, "detail": str(error)})
+                continue
+            batch.append((index, tag, patterns, responses))
+            if len(batch) >= BATCH_SIZE:
+                _insert_batch(db, batch, report, seen_tags)
+                db.expunge_all()
+                batch = []
+        _insert_batch(db, batch, report, seen_tags)
+        db.commit()
+        if report["intents"]:
+            response_cache.invalidate("intents")
+            search.index.invalidate()
+        report["errors"].sort(key=lambda error: error["index"])
+    except Exception:
+        db.rollback()
+        raise
+    return report
+
+
+# pick the format from the file name unless it was given explicitly
+def detect_format(filename: str, file_format: str = None):
+    if file_format:
+        return file_format
+    if filename and filename.lower().endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    return "json"
+
+
+def open_text(binary_file):
+    return io.TextIOWrapper(binary_file, encoding="utf-8")
+
+
+# command line: python -m services.imports intents.json
+if __name__ == "__main__":
+    from database.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Bulk import intents from a JSON or NDJSON file.")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["json", "ndjson"])
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        with open(args.path, encoding="utf-8") as f:
+            result = import_intents(db, f, detect_format(args.path, args.format))
+    finally:
+        db.close()
+    print(json.dumps(result, indent=2))
@@ -1,13 +1,49 @@
+from collections import Counter
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from database import models
 import schemas
+from services import pattern_index, response_cache, search, snapshots
+from services.loading import INTENT_TREE
 
 # object-relational-mapping (ORM) crud operations (performs SQL under the hood)
 
 
-# read
-def get_intents(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Intent).offset(skip).limit(limit).all()
+# get the IDs of every NPC using an intent
+
+
+def get_intent_npc_ids(db: Session, intent_id: int):
+    rows = db.query(models.NPCIntent.c.npc_id).filter(
+        models.NPCIntent.c.intent_id == intent_id).all()
+    return [npc_id for (npc_id,) in rows]
+
+# drop everything cached from an intent: the pattern indexes of every NPC using it and the
+# cached responses that embed it; re-index its texts for search. Models stay cached: they
+# are keyed by the corpus they were trained on, and answer until their retrained successor is in
+
+
+def invalidate_intent(db: Session, intent_id: int, npc_ids: list[int] = None):
+    if npc_ids is None:
+        npc_ids = get_intent_npc_ids(db, intent_id)
+    for npc_id in npc_ids:
+        pattern_index.indexes.invalidate(npc_id)
+    response_cache.invalidate("intents", "projects")
+    search.index.sync_intent(db, intent_id)
+
+
+# read intents ordered by ID; after_id continues a keyset page
+def get_intents(db: Session, skip: int = 0, limit: int = 100, load_tree: bool = True,
+                after_id: int = None):
+    query = db.query(models.Intent)
+    if load_tree:
+        query = query.options(*INTENT_TREE)
+    if after_id is not None:
+        query = query.filter(models.Intent.id > after_id)
+    return query.order_by(models.Intent.id).offset(skip).limit(limit).all()
+
+
+def count_intents(db: Session):
+    return db.query(func.count(models.Intent.id)).scalar()
 
 # get intent by id
 
@@ -22,8 +58,7 @@ def create_intent(db: Session, intent: schemas.IntentCreate):
         tag=intent.tag
     )
     db.add(db_intent)
-    db.commit()
-    db.refresh(db_intent)
+    db.flush()
 
     # Create and add patterns to the intent
     for pattern in intent.patterns:
@@ -45,6 +80,9 @@ def create_intent(db: Session, intent: schemas.IntentCreate):
 
     db.commit()
     db.refresh(db_intent)
+    # a new intent isn't used by any NPC yet
+    response_cache.invalidate("intents")
+    search.index.sync_intent(db, db_intent.id)
     return db_intent
 
 
@@ -54,8 +92,11 @@ def create_intent(db: Session, intent: schemas.IntentCreate):
 def create_intent_pattern(db: Session, pattern: schemas.PatternCreate, intent_id: int):
     db_pattern = models.Pattern(text=pattern.text, intent_id=intent_id)
     db.add(db_pattern)
+    npc_ids = get_intent_npc_ids(db, intent_id)
+    snapshots.refresh(db, npc_ids)
     db.commit()
     db.refresh(db_pattern)
+    invalidate_intent(db, intent_id, npc_ids)
     return db_pattern
 
 # create a response{} for intent
@@ -64,8 +105,11 @@ def create_intent_pattern(db: Session, pattern: schemas.PatternCreate, intent_id
 def create_intent_response(db: Session, response: schemas.ResponseCreate, intent_id: int):
     db_pattern = models.Response(text=response.text, intent_id=intent_id)
     db.add(db_pattern)
+    npc_ids = get_intent_npc_ids(db, intent_id)
+    snapshots.refresh(db, npc_ids)
     db.commit()
     db.refresh(db_pattern)
+    invalidate_intent(db, intent_id, npc_ids)
     return db_pattern
 
 # delete an intent by ID
@@ -74,44 +118,63 @@ def create_intent_response(db: Session, response: schemas.ResponseCreate, intent
 def delete_intent(db: Session, intent_id: int):
     db_intent = db.query(models.Intent).filter(
         models.Intent.id == intent_id).first()
+    npc_ids = get_intent_npc_ids(db, intent_id)
     db.delete(db_intent)
+    snapshots.refresh(db, npc_ids)
     db.commit()
+    invalidate_intent(db, intent_id, npc_ids)
     return {"Intent Deleted": intent_id}
 
 # update an intent by ID
 
 
+# bring an intent's pattern or response rows in line with texts, touching
+# only the rows that differ; returns whether anything changed
+
+
+def sync_texts(db: Session, model, intent_id: int, texts: list[str]):
+    rows = db.query(model.id, model.text).filter(
+        model.intent_id == intent_id).all()
+
+    # keep one existing row per wanted text, delete the rest
+    wanted = Counter(texts)
+    stale_ids = []
+    for row_id, text in rows:
+        if wanted[text] > 0:
+            wanted[text] -= 1
+        else:
+            stale_ids.append(row_id)
+
+    if stale_ids:
+        db.query(model).filter(model.id.in_(stale_ids)).delete(
+            synchronize_session=False)
+    for text, count in wanted.items():
+        for _ in range(count):
+            db.add(model(text=text, intent_id=intent_id))
+    return bool(stale_ids) or sum(wanted.values()) > 0
+
+
 def update_intent(db: Session, intent_id: int, intent: schemas.Intent):
     # get the intent from the database
     db_intent = db.query(models.Intent).filter(
         models.Intent.id == intent_id).first()
 
     if db_intent:
+        changed = db_intent.tag != intent.tag
         # update the tag
         db_intent.tag = intent.tag
 
-        # remove any existing patterns and responses
-        db.query(models.Pattern).filter(
-            models.Pattern.intent_id == intent_id).delete()
-        db.query(models.Response).filter(
-            models.Response.intent_id == intent_id).delete()
-
-        # add the new patterns and responses
-        for pattern in intent.patterns:
-            db_pattern = models.Pattern(
-                text=pattern.text,
-                intent_id=intent_id
-            )
-            db.add(db_pattern)
-
-        for response in intent.responses:
-            db_response = models.Response(
-                text=response.text,
-                intent_id=intent_id
-            )
-            db.add(db_response)
+        # apply only the pattern and response inserts/deletes that are needed
+        changed |= sync_texts(db, models.Pattern, intent_id,
+                              [pattern.text for pattern in intent.patterns])
+        changed |= sync_texts(db, models.Response, intent_id,
+                              [response.text for response in intent.responses])
 
+        npc_ids = get_intent_npc_ids(db, intent_id) if changed else []
+        snapshots.refresh(db, npc_ids)
         db.commit()
+        if changed:
+            invalidate_intent(db, intent_id, npc_ids)
 
         return db_intent
 
@@ -0,0 +1,22 @@
+from sqlalchemy.orm import selectinload
+from database import models
+
+# eager-loading strategies for the read paths: each level of a serialized tree
+# is fetched with one SELECT ... IN query instead of one lazy load per row
+
+INTENT_TREE = (
+    selectinload(models.Intent.patterns),
+    selectinload(models.Intent.responses),
+)
+
+NPC_TREE = (
+    selectinload(models.NPC.intents).options(*INTENT_TREE),
+)
+
+PROJECT_TREE = (
+    selectinload(models.Project.npcs).options(*NPC_TREE),
+)
+
+USER_TREE = (
+    selectinload(models.User.projects).options(*PROJECT_TREE),
+)
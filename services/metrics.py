@@ -0,0 +1,260 @@
+import contextvars
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from dotenv import load_dotenv
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# per-request timing: the middleware opens a RequestMetrics for each HTTP request, hot-path
+# code times its stages with `with metrics.stage("inference"):`, and SQLAlchemy cursor events
+# count every statement and its duration against the request running it. Totals are kept as
+# Prometheus histograms labelled by route template, served at /metrics; with
+# METRICS_SERVER_TIMING the breakdown is also sent back in a Server-Timing header.
+
+load_dotenv()
+ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+SERVER_TIMING = os.getenv("METRICS_SERVER_TIMING", "false").lower() in ("1", "true", "yes")
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+# route label of stages that run outside any request (training callbacks, background threads,
+# and the background tasks a request leaves running after its response was sent)
+BACKGROUND = "background"
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple, buckets: tuple):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_values: tuple, value: float):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((key, (list(counts), total, count))
+                            for key, (counts, total, count) in self._series.items())
+        for label_values, (counts, total, count) in series:
+            labels = _labels(self.labels, label_values)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{labels}}} {total}")
+            lines.append(f"{self.name}_count{{{labels}}} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter", f"{self.name} {self.value}"]
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _token(name: str):
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", name)
+
+
+def _labels(names: tuple, values: tuple):
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+requests = Histogram("http_request_duration_seconds", "Time to handle a request, response body included.",
+                     ("method", "route", "status"), LATENCY_BUCKETS)
+stages = Histogram("http_request_stage_duration_seconds", "Time spent in one stage of a request.",
+                   ("route", "stage"), LATENCY_BUCKETS)
+sql_queries = Histogram("http_request_sql_queries", "SQL statements executed per request.",
+                        ("route",), COUNT_BUCKETS)
+sql_durations = Histogram("http_request_sql_duration_seconds", "Time spent executing SQL per request.",
+                          ("route",), LATENCY_BUCKETS)
+background_queries = Counter("sql_background_queries_total", "SQL statements executed outside any request.")
+background_sql_seconds = Counter("sql_background_duration_seconds_total",
+                                 "Time spent executing SQL outside any request.")
+METRICS = [requests, stages, sql_queries, sql_durations, background_queries, background_sql_seconds]
+
+
+def _observe_background_stage(name: str, seconds: float):
+    stages.observe((BACKGROUND, name), seconds)
+
+
+def _observe_background_query(seconds: float):
+    background_queries.inc()
+    background_sql_seconds.inc(seconds)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        # set once the response is sent; what runs after it is background work
+        self.finished = False
+        self._lock = threading.Lock()
+
+    def add_stage(self, name: str, seconds: float):
+        with self._lock:
+            if not self.finished:
+                self.stages[name] = self.stages.get(name, 0.0) + seconds
+                return
+        _observe_background_stage(name, seconds)
+
+    def add_query(self, seconds: float):
+        with self._lock:
+            if not self.finished:
+                self.sql_count += 1
+                self.sql_seconds += seconds
+                return
+        _observe_background_query(seconds)
+
+    # record the request's totals under its route, once
+    def finish(self, method: str, route: str, status: int):
+        with self._lock:
+            if self.finished:
+                return
+            self.finished = True
+        requests.observe((method, route, str(status)), time.perf_counter() - self.started)
+        for name, seconds in self.stages.items():
+            stages.observe((route, name), seconds)
+        sql_queries.observe((route,), self.sql_count)
+        sql_durations.observe((route,), self.sql_seconds)
+
+    # Server-Timing value: one entry per stage, the SQL total and the time so far
+    def server_timing(self):
+        entries = [f"{_token(name)};dur={seconds * 1000:.2f}" for name, seconds in self.stages.items()]
+        entries.append(f'db;dur={self.sql_seconds * 1000:.2f};desc="{self.sql_count} queries"')
+        entries.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.2f}")
+        return ", ".join(entries)
+
+
+_current = contextvars.ContextVar("request_metrics", default=None)
+
+
+# time the enclosed block as a stage of the current request (or of background work)
+@contextmanager
+def stage(name: str):
+    if not ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        current = _current.get()
+        if current is not None:
+            current.add_stage(name, seconds)
+        else:
+            _observe_background_stage(name, seconds)
+
+
+# SQL statement counting; statements inherit the request through the context, including the
+# ones run in threadpool workers and in the async engines' greenlets
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if ENABLED:
+        conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("metrics_started")
+    if not started:
+        return
+    seconds = time.perf_counter() - started.pop()
+    current = _current.get()
+    if current is not None:
+        current.add_query(seconds)
+    else:
+        _observe_background_query(seconds)
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("metrics_started"):
+        connection.info["metrics_started"].pop()
+
+
+def _route(scope):
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+# ASGI middleware recording every HTTP request; websockets pass straight through. A request
+# ends with its last body chunk: background tasks run after that, and are recorded as such
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        current = RequestMetrics()
+        token = _current.set(current)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if SERVER_TIMING:
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"server-timing", current.server_timing().encode("latin-1"))]
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                current.finish(scope["method"], _route(scope), status)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            # no complete response: an error, or a client gone mid-stream
+            current.finish(scope["method"], _route(scope), status)
+
+
+# Prometheus text exposition of the metrics, plus gauges for the given stats
+# dicts ({"model_cache": {"hits": 3, ...}} -> model_cache_hits 3)
+def render(gauges: dict = None):
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    for prefix, values in (gauges or {}).items():
+        for key, value in values.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                name = _token(f"{prefix}_{key}")
+                lines.extend([f"# TYPE {name} gauge", f"{name} {value}"])
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,121 @@
+import os
+import sys
+import threading
+from collections import Counter, OrderedDict
+from dotenv import load_dotenv
+
+# in-process LRU cache of ready-to-use chatbot models, keyed by (npc_id, version)
+
+load_dotenv()
+MAX_ENTRIES = int(os.getenv("MODEL_CACHE_MAX_ENTRIES", "32"))
+MAX_BYTES = int(os.getenv("MODEL_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+
+# rough deep size of a loaded model (numpy arrays / torch tensors report their buffers);
+# memory-mapped arrays are page cache shared by every worker, so they don't count
+def estimate_size(obj, seen=None):
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    numpy = sys.modules.get("numpy")
+    if numpy is not None and isinstance(obj, numpy.memmap):
+        return 0
+
+    if hasattr(obj, "element_size") and hasattr(obj, "nelement"):
+        return obj.element_size() * obj.nelement()
+    nbytes = getattr(obj, "nbytes", None)
+    if isinstance(nbytes, int):
+        return nbytes
+
+    size = sys.getsizeof(obj, 0)
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += estimate_size(key, seen) + estimate_size(value, seen)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for item in obj:
+            size += estimate_size(item, seen)
+    elif hasattr(obj, "__dict__"):
+        size += estimate_size(vars(obj), seen)
+    return size
+
+
+class ModelCache:
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # lookups per NPC, for picking the models to preload on the next start
+        self.usage = Counter()
+
+    # return the cached model, or build it with loader() and cache it
+    def get_or_load(self, npc_id: int, version, loader):
+        key = (npc_id, version)
+        with self._lock:
+            self.usage[npc_id] += 1
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        # load outside the lock so other NPCs keep being served
+        model = loader()
+        size = estimate_size(model)
+
+        with self._lock:
+            if key in self._entries:
+                return self._entries[key]
+            self._entries[key] = model
+            self._sizes[key] = size
+            self._bytes += size
+            self._evict()
+        return model
+
+    # drop every cached version of an NPC's model (its intents changed)
+    def invalidate(self, npc_id: int):
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == npc_id]:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _remove(self, key):
+        del self._entries[key]
+        self._bytes -= self._sizes.pop(key)
+
+    # evict least recently used entries, always keeping the newest one
+    def _evict(self):
+        while len(self._entries) > 1 and (
+                len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            key = next(iter(self._entries))
+            self._remove(key)
+            self.evictions += 1
+
+
+models = ModelCache(MAX_ENTRIES, MAX_BYTES)
@@ -1,21 +1,55 @@
-from sqlalchemy.orm import Session
+import json
+from contextlib import nullcontext
+from sqlalchemy import func
+from sqlalchemy.orm import Session, lazyload
 from database import models
 import schemas
-from NpcTrainerAI.chat import ChatBot
+from services import metrics, model_cache, pattern_index, response_cache, snapshots, training
+from services.loading import NPC_TREE
 
 # object-relational-mapping (ORM) crud operations (performs SQL under the hood)
 
-# get NPC by ID
+# drop the cached responses embedding an NPC, and its pattern index when its corpus
+# changed (its cached model keeps answering until the retrained one is in)
 
 
-def get_npc(db: Session, npc_id: int):
-    return db.query(models.NPC).filter(models.NPC.id == npc_id).first()
+def invalidate_npc(npc_id: int, corpus_changed: bool = True):
+    if corpus_changed:
+        pattern_index.indexes.invalidate(npc_id)
+    response_cache.invalidate("projects")
 
-# get all NPCs
+# get NPC by ID; load_tree=False reads its own columns only, for callers that just
+# check it exists or need its voice and style
 
 
-def get_npcs(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.NPC).offset(skip).limit(limit).all()
+def get_npc(db: Session, npc_id: int, load_tree: bool = True):
+    query = db.query(models.NPC)
+    if load_tree:
+        query = query.options(*NPC_TREE)
+    else:
+        # NPC.intents is joined eagerly by default; load it only if it is read
+        query = query.options(lazyload(models.NPC.intents))
+    return query.filter(models.NPC.id == npc_id).first()
+
+# get the IDs of the given NPCs that exist
+
+
+def get_existing_npc_ids(db: Session, npc_ids: list[int]):
+    rows = db.query(models.NPC.id).filter(models.NPC.id.in_(npc_ids)).all()
+    return {npc_id for (npc_id,) in rows}
+
+# get all NPCs ordered by ID; after_id continues a keyset page
+
+
+def get_npcs(db: Session, skip: int = 0, limit: int = 100, after_id: int = None):
+    query = db.query(models.NPC).options(*NPC_TREE)
+    if after_id is not None:
+        query = query.filter(models.NPC.id > after_id)
+    return query.order_by(models.NPC.id).offset(skip).limit(limit).all()
+
+
+def count_npcs(db: Session):
+    return db.query(func.count(models.NPC.id)).scalar()
 
 # create a new NPC for a given project
 
@@ -28,9 +62,12 @@ def create_project_npc(db: Session, npc: schemas.NPCCreate, project_id: int):
         db_npc.avatar = npc.avatar
     db_project.npcs.append(db_npc)
     db.add(db_npc)
+    db.flush()
+    snapshots.refresh(db, [db_npc.id])
     db.commit()
     db.refresh(db_npc)
     db.refresh(db_project)
+    invalidate_npc(db_npc.id, corpus_changed=False)
     return db_npc
 
 
@@ -44,6 +81,10 @@ def delete_npc(db: Session, npc_id: int):
     project.npcs.remove(db_npc)
     db.delete(db_npc)
     db.commit()
+    invalidate_npc(npc_id)
+    model_cache.models.invalidate(npc_id)
+    from services import classifiers
+    classifiers.remove_models(npc_id)
     return {"NPC Deleted": npc_id}
 
 
@@ -65,18 +106,25 @@ def update_npc(db: Session, npc_id: int, npc: schemas.NPC):
         db_npc.voice = npc.voice
         # update the style
         db_npc.style = npc.style
-
-        # clear the existing intents
-        db_npc.intents = []
-
-        # add the selected intents
-        for intent in npc.intents:
-            intent = db.query(models.Intent).filter(
-                models.Intent.id == intent.id).first()
-            if intent:
-                db_npc.intents.append(intent)
-
+        # update the classifier backend
+        db_npc.classifier = npc.classifier
+
+        # unlink the intents that are no longer selected
+        selected_ids = {intent.id for intent in npc.intents}
+        current_ids = {intent.id for intent in db_npc.intents}
+        for intent in [i for i in db_npc.intents if i.id not in selected_ids]:
+            db_npc.intents.remove(intent)
+
+        # link the newly selected intents, fetched in a single IN query
+        added_ids = selected_ids - current_ids
+        if added_ids:
+            db_npc.intents.extend(db.query(models.Intent).filter(
+                models.Intent.id.in_(added_ids)).all())
+
+        intents_changed = current_ids != {intent.id for intent in db_npc.intents}
+        snapshots.refresh(db, [npc_id])
         db.commit()
+        invalidate_npc(npc_id, corpus_changed=intents_changed)
 
     return db_npc
 
@@ -88,7 +136,9 @@ def update_npc_avatar(db: Session, npc_id: int, avatar: str):
     db_npc = db.query(models.NPC).filter(models.NPC.id == npc_id).first()
     if db_npc:
         db_npc.avatar = avatar
+        snapshots.refresh(db, [npc_id])
         db.commit()
+        invalidate_npc(npc_id, corpus_changed=False)
         db.refresh(db_npc)
         return db_npc
 
@@ -98,8 +148,9 @@ def update_npc_avatar(db: Session, npc_id: int, avatar: str):
 
 def get_intents(db: Session, npc_id: int):
     # find the npc by ID
-    db_npc = db.query(models.NPC).filter(
-        models.NPC.id == npc_id).first()
+    db_npc = get_npc(db, npc_id)
+    if db_npc is None:
+        return None
 
     # create a list to store the intents
     intents = []
@@ -117,14 +168,130 @@ def get_intents(db: Session, npc_id: int):
     # return the list of intents
     return intents
 
+# version of the NPC's training corpus (intents, patterns & responses): the etag of its
+# intents snapshot, stored whenever the corpus is written, so checking it is one lookup
+
+
+def get_corpus_fingerprint(db: Session, npc_id: int):
+    return snapshots.get_intents_etag(db, npc_id)
+
+# fingerprint of the corpus the NPC's model was last trained on
+
+
+def get_trained_fingerprint(db: Session, npc_id: int):
+    db_model = db.query(models.NPCModel).filter(
+        models.NPCModel.npc_id == npc_id).first()
+    return db_model.fingerprint if db_model else None
+
+
+def set_trained_fingerprint(db: Session, npc_id: int, fingerprint: str):
+    db_model = db.query(models.NPCModel).filter(
+        models.NPCModel.npc_id == npc_id).first()
+    if db_model is None:
+        db_model = models.NPCModel(npc_id=npc_id)
+        db.add(db_model)
+    db_model.fingerprint = fingerprint
+    db.commit()
+
+
+def load_chatbot(npc_id: int, training_required: bool):
+    # the ML stack is imported on the first model load, not when the app starts
+    from NpcTrainerAI.chat import ChatBot
+    # training runs in a job directory of its own; loads read the installed model
+    lock = nullcontext() if training_required else training.model_lock(npc_id)
+    with metrics.stage("chatbot_setup"), lock:
+        chatbot = ChatBot(training_required, npc_id)
+        chatbot.setup()
+    return chatbot
+
+# the NPC's chatbot model; a changed corpus is retrained in the background
+# while the last good model keeps answering
+
+
+def get_chatbot(db: Session, npc_id: int):
+    fingerprint = get_corpus_fingerprint(db, npc_id)
+    trained_fingerprint = get_trained_fingerprint(db, npc_id)
+
+    if trained_fingerprint != fingerprint:
+        job = training.submit(npc_id, fingerprint)
+        # never trained before, so there is nothing to answer from yet
+        if trained_fingerprint is None:
+            with metrics.stage("training_wait"):
+                trained_fingerprint = training.wait(job).fingerprint
+
+    return model_cache.models.get_or_load(
+        npc_id, trained_fingerprint, lambda: load_chatbot(npc_id, False))
+
+# the NPC's built-in TF-IDF classifier, retrained (or mapped from the copy another worker
+# saved) whenever its intents snapshot changes
+
+
+def get_tfidf_classifier(db: Session, npc_id: int):
+    version = snapshots.get_intents_etag(db, npc_id)
+
+    def load():
+        from services import classifiers
+        return classifiers.get_classifier(
+            npc_id, version, lambda: json.loads(snapshots.get_intents(db, npc_id)[0]))
+
+    return model_cache.models.get_or_load(npc_id, ("tfidf", version), load)
+
+
+# classifier backends an NPC can select; each returns an object answering
+# get_response(sentence), and optionally get_responses(sentences)
+CLASSIFIERS = {
+    "chatbot": get_chatbot,
+    "tfidf": get_tfidf_classifier,
+}
+
+
+def get_classifier(db: Session, npc_id: int):
+    name = db.query(models.NPC.classifier).filter(
+        models.NPC.id == npc_id).scalar()
+    return CLASSIFIERS.get(name, get_chatbot)(db, npc_id)
+
+# load the NPC's pattern index and classifier ahead of its first chat; False when it
+# doesn't exist or is a chatbot NPC that was never trained (preloading doesn't train)
+
+
+def preload(db: Session, npc_id: int):
+    name = db.query(models.NPC.classifier).filter(
+        models.NPC.id == npc_id).scalar()
+    if name is None:
+        return False
+    if CLASSIFIERS.get(name, get_chatbot) is get_chatbot and get_trained_fingerprint(db, npc_id) is None:
+        return False
+    pattern_index.indexes.get(db, npc_id)
+    get_classifier(db, npc_id)
+    return True
+
+# AI neural network responses for several sentences sent to the same NPC
+
+
+def get_responses(db: Session, sentences: list[str], npc_id: int):
+    # sentences matching one of the NPC's patterns skip the model
+    with metrics.stage("pattern_match"):
+        responses = pattern_index.indexes.match(db, npc_id, sentences)
+    missed = [index for index, response in enumerate(responses) if response is None]
+
+    if missed:
+        with metrics.stage("model_load"):
+            chatbot = get_classifier(db, npc_id)
+        missed_sentences = [sentences[index] for index in missed]
+        # classify the whole group in one call when the model supports it
+        with metrics.stage("inference"):
+            if hasattr(chatbot, "get_responses"):
+                answers = chatbot.get_responses(missed_sentences)
+            else:
+                answers = [chatbot.get_response(sentence) for sentence in missed_sentences]
+        for index, answer in zip(missed, answers):
+            responses[index] = answer
+
+    return ["Sorry, I don't understand..." if response == None else response
+            for response in responses]
+
 # AI neural network response
 
 
-def get_response(sentence: str, npc_id: int, training_required: bool):
-    chatbot = ChatBot(training_required, npc_id)
-    chatbot.setup()
-    response = chatbot.get_response(sentence)
-    if response == None:
-        return "Sorry, I don't understand..."
-    else:
-        return response
+def get_response(db: Session, sentence: str, npc_id: int):
+    return get_responses(db, [sentence], npc_id)[0]
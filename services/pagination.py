@@ -0,0 +1,30 @@
+import base64
+import binascii
+import json
+
+# opaque keyset (cursor) pagination tokens: each one encodes the last id of the previous page
+
+
+def encode_cursor(last_id: int):
+    token = json.dumps({"id": last_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(token).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        token = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        last_id = json.loads(token)["id"]
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(last_id, int):
+        raise ValueError("Invalid cursor")
+    return last_id
+
+
+# token for the page after items (ORM objects or serialized dicts), or None once a
+# short page shows the end was reached
+def next_cursor(items: list, limit: int):
+    if limit <= 0 or len(items) < limit:
+        return None
+    last = items[-1]
+    return encode_cursor(last["id"] if isinstance(last, dict) else last.id)
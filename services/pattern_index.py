@@ -0,0 +1,107 @@
+import json
+import os
+import random
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+from sqlalchemy.orm import Session
+from services import snapshots
+from services.text import normalize
+
+# fast path in front of the neural model: a sentence equal to one of the NPC's patterns
+# after case and punctuation folding is answered from that intent's responses directly.
+# Each NPC's index is built from its intents snapshot and keyed by the snapshot's etag,
+# so a write to the NPC or its intents replaces it on the next lookup.
+
+load_dotenv()
+MAX_NPCS = int(os.getenv("PATTERN_INDEX_MAX_NPCS", "1024"))
+
+
+class PatternIndex:
+    def __init__(self, version: str, intents: list):
+        self.version = version
+        owners = {}
+        self.responses = {}
+        for intent in intents:
+            self.responses[intent["id"]] = intent["responses"]
+            for pattern in intent["patterns"]:
+                key = normalize(pattern)
+                if key:
+                    owners.setdefault(key, set()).add(intent["id"])
+        # a text claimed by several intents, or by one without responses, is left to the model
+        self.patterns = {}
+        for key, intent_ids in owners.items():
+            if len(intent_ids) == 1:
+                intent_id = next(iter(intent_ids))
+                if self.responses[intent_id]:
+                    self.patterns[key] = intent_id
+
+    # a response for sentence, or None when no pattern matches
+    def match(self, sentence: str):
+        intent_id = self.patterns.get(normalize(sentence))
+        if intent_id is None:
+            return None
+        return random.choice(self.responses[intent_id])
+
+
+class PatternIndexes:
+    def __init__(self, max_npcs: int):
+        self.max_npcs = max_npcs
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, db: Session, npc_id: int):
+        version = snapshots.get_intents_etag(db, npc_id)
+        if version is None:
+            return None
+        with self._lock:
+            index = self._indexes.get(npc_id)
+            if index is not None and index.version == version:
+                self._indexes.move_to_end(npc_id)
+                return index
+
+        snapshot = snapshots.get_intents(db, npc_id)
+        if snapshot is None:
+            return None
+        body, version = snapshot
+        index = PatternIndex(version, json.loads(body))
+        with self._lock:
+            self._indexes[npc_id] = index
+            self._indexes.move_to_end(npc_id)
+            while len(self._indexes) > self.max_npcs:
+                self._indexes.popitem(last=False)
+        return index
+
+    # a response per sentence, None where the model has to answer
+    def match(self, db: Session, npc_id: int, sentences: list[str]):
+        index = self.get(db, npc_id)
+        responses = [index.match(sentence) if index else None for sentence in sentences]
+        self.count(responses)
+        return responses
+
+    # add the outcome of matched sentences (None for a miss) to the hit rate
+    def count(self, responses: list):
+        hits = sum(response is not None for response in responses)
+        with self._lock:
+            self.hits += hits
+            self.misses += len(responses) - hits
+
+    def invalidate(self, npc_id: int):
+        with self._lock:
+            self._indexes.pop(npc_id, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "npcs": len(self._indexes),
+                "patterns": sum(len(index.patterns) for index in self._indexes.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+indexes = PatternIndexes(MAX_NPCS)
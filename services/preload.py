@@ -0,0 +1,70 @@
+import json
+import os
+import tempfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from database.database import SessionLocal
+from services import model_cache, npcs
+
+# warm start: load the most-used NPCs' models and pattern indexes before a worker takes
+# traffic. Each worker adds its model lookups per NPC to a usage file when it shuts down;
+# the next worker to start preloads the top PRELOAD_NPCS of them in parallel.
+
+load_dotenv()
+# a count (top N by usage) or a comma-separated list of NPC IDs; 0 turns preloading off
+PRELOAD_NPCS = os.getenv("PRELOAD_NPCS", "0")
+WORKERS = int(os.getenv("PRELOAD_WORKERS", "4"))
+USAGE_PATH = os.getenv("PRELOAD_USAGE_PATH", ".npc_usage.json")
+
+
+def read_usage():
+    try:
+        with open(USAGE_PATH) as f:
+            return Counter({int(npc_id): count for npc_id, count in json.load(f).items()})
+    except (OSError, ValueError):
+        return Counter()
+
+
+# add this worker's lookups to the usage file; replaced atomically so concurrent
+# workers never read half a file (one of two simultaneous writers wins)
+def save_usage():
+    usage = read_usage()
+    usage.update(model_cache.models.usage)
+    directory = os.path.dirname(os.path.abspath(USAGE_PATH))
+    with tempfile.NamedTemporaryFile("w", dir=directory, delete=False) as f:
+        json.dump({str(npc_id): count for npc_id, count in usage.most_common()}, f)
+    os.replace(f.name, USAGE_PATH)
+
+
+def get_npc_ids():
+    if not PRELOAD_NPCS.strip().isdigit():
+        return [int(npc_id) for npc_id in PRELOAD_NPCS.split(",") if npc_id.strip()]
+    return [npc_id for npc_id, _ in read_usage().most_common(int(PRELOAD_NPCS))]
+
+
+def _preload_npc(npc_id: int):
+    db = SessionLocal()
+    try:
+        return npcs.preload(db, npc_id)
+    except Exception:
+        # a model that fails to load is loaded (or reported) again on its first chat
+        return False
+    finally:
+        db.close()
+
+
+# load the given NPCs with WORKERS threads; returns how many were loaded
+def preload(npc_ids: list[int], workers: int = WORKERS):
+    if not npc_ids:
+        return 0
+    # preloading isn't usage: keep it out of the counts saved for the next start
+    usage = model_cache.models.usage.copy()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        loaded = sum(executor.map(_preload_npc, npc_ids))
+    model_cache.models.usage = usage
+    return loaded
+
+
+def enabled():
+    return PRELOAD_NPCS.strip() not in ("", "0")
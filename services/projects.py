@@ -1,6 +1,9 @@
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from database import models
 import schemas
+from services import model_cache, response_cache
+from services.loading import PROJECT_TREE
 
 # object-relational-mapping (ORM) crud operations (performs SQL under the hood)
 
@@ -10,11 +13,24 @@ import schemas
 def get_project(db: Session, project_id: int):
     return db.query(models.Project).filter(models.Project.id == project_id).first()
 
-# get all projects
+# check a project exists without loading it
 
 
-def get_projects(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Project).offset(skip).limit(limit).all()
+def project_exists(db: Session, project_id: int):
+    return db.query(models.Project.id).filter(models.Project.id == project_id).first() is not None
+
+# get all projects ordered by ID; after_id continues a keyset page
+
+
+def get_projects(db: Session, skip: int = 0, limit: int = 100, after_id: int = None):
+    query = db.query(models.Project).options(*PROJECT_TREE)
+    if after_id is not None:
+        query = query.filter(models.Project.id > after_id)
+    return query.order_by(models.Project.id).offset(skip).limit(limit).all()
+
+
+def count_projects(db: Session):
+    return db.query(func.count(models.Project.id)).scalar()
 
 # create a new project for a given user
 
@@ -24,6 +40,7 @@ def create_user_project(db: Session, project: schemas.ProjectCreate, user_id: in
     db.add(db_project)
     db.commit()
     db.refresh(db_project)
+    response_cache.invalidate("projects")
     return db_project
 
 # delete project by ID
@@ -32,8 +49,15 @@ def create_user_project(db: Session, project: schemas.ProjectCreate, user_id: in
 def delete_project(db: Session, project_id: int):
     db_project = db.query(models.Project).filter(
         models.Project.id == project_id).first()
+    # the project's NPCs are deleted with it
+    npc_ids = [npc.id for npc in db_project.npcs]
     db.delete(db_project)
     db.commit()
+    from services import classifiers
+    for npc_id in npc_ids:
+        model_cache.models.invalidate(npc_id)
+        classifiers.remove_models(npc_id)
+    response_cache.invalidate("projects")
     return {"Project Deleted": project_id}
 
 # update project by ID
@@ -51,4 +75,5 @@ def update_project(db: Session, project_id: int, project: schemas.Project):
         db_project.description = project.description
 
     db.commit()
+    response_cache.invalidate("projects")
     return db_project
@@ -0,0 +1,186 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+# read-through cache of serialized GET responses, keyed by resource version.
+# Writes bump the version of every resource they touch, so stale entries are never read again.
+# The default SQLite backend shares versions between the workers of a host; TTL bounds how
+# long an entry is served where versions aren't shared (the memory backend, other hosts).
+
+load_dotenv()
+BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "sqlite")
+MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "10000"))
+SQLITE_PATH = os.getenv("RESPONSE_CACHE_PATH", ".response_cache.sqlite3")
+# seconds an entry is served for; 0 keeps entries until their version changes
+TTL = float(os.getenv("RESPONSE_CACHE_TTL", "60"))
+
+
+class Entry:
+    def __init__(self, body: bytes, headers: dict, etag: str = None, created: float = None):
+        self.body = body
+        self.headers = headers
+        self.etag = etag or '"' + hashlib.sha1(body).hexdigest() + '"'
+        self.created = created if created is not None else time.time()
+
+    def expired(self):
+        return TTL > 0 and time.time() - self.created >= TTL
+
+
+# per-process cache; versions are only seen by this worker, so a write handled by
+# another worker reaches it through TTL only
+class MemoryBackend:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get_version(self, resource: str):
+        with self._lock:
+            return self._versions.get(resource, 0)
+
+    def bump(self, resource: str):
+        with self._lock:
+            self._versions[resource] = self._versions.get(resource, 0) + 1
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, entry: Entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+# SQLite file shared by every worker process on the host, so a write seen by
+# one worker invalidates the entries of all of them
+class SQLiteBackend:
+    TRIM_EVERY = 100
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._sets = 0
+
+    # one connection per thread, opened (and the tables created) on first use
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS versions (resource TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, etag TEXT NOT NULL, "
+                "headers TEXT NOT NULL, body BLOB NOT NULL, created REAL NOT NULL)")
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS entries_created ON entries (created)")
+            self._local.connection = connection
+        return connection
+
+    def get_version(self, resource: str):
+        row = self._connection().execute(
+            "SELECT version FROM versions WHERE resource = ?", (resource,)).fetchone()
+        return row[0] if row else 0
+
+    def bump(self, resource: str):
+        self._connection().execute(
+            "INSERT INTO versions (resource, version) VALUES (?, 1) "
+            "ON CONFLICT (resource) DO UPDATE SET version = version + 1", (resource,))
+
+    def get(self, key: str):
+        row = self._connection().execute(
+            "SELECT etag, headers, body, created FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        etag, headers, body, created = row
+        return Entry(body, json.loads(headers), etag, created)
+
+    def set(self, key: str, entry: Entry):
+        connection = self._connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO entries (key, etag, headers, body, created) VALUES (?, ?, ?, ?, ?)",
+            (key, entry.etag, json.dumps(entry.headers), entry.body, entry.created))
+        # entries of old versions are never read again; drop the oldest ones past the budget
+        self._sets += 1
+        if self._sets % self.TRIM_EVERY == 0:
+            connection.execute(
+                "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY created DESC "
+                "LIMIT -1 OFFSET ?)", (self.max_entries,))
+
+
+class NullBackend:
+    def get_version(self, resource: str):
+        return 0
+
+    def bump(self, resource: str):
+        pass
+
+    def get(self, key: str):
+        return None
+
+    def set(self, key: str, entry: Entry):
+        pass
+
+
+def create_backend(name: str):
+    if name == "sqlite":
+        return SQLiteBackend(SQLITE_PATH, MAX_ENTRIES)
+    if name == "none":
+        return NullBackend()
+    return MemoryBackend(MAX_ENTRIES)
+
+
+backend = create_backend(BACKEND)
+hits = 0
+misses = 0
+
+
+# resources are the cached list endpoints, "projects" and "intents";
+# mark resources as changed; their cached responses are never served again
+def invalidate(*resources: str):
+    for resource in set(resources):
+        backend.bump(resource)
+
+
+# the cached response for (resource, variant), or build() -> (body, headers) and cache it.
+# build must read the primary: a replica may not have the write behind the current version yet
+def get_or_build(resource: str, variant: str, build):
+    global hits, misses
+    # read the version before building, so a write that lands mid-build leaves
+    # this entry under an outdated key instead of caching stale data as current
+    key = f"{resource}@{backend.get_version(resource)}:{variant}"
+    entry = backend.get(key)
+    if entry is not None and not entry.expired():
+        hits += 1
+        return entry
+
+    misses += 1
+    body, headers = build()
+    entry = Entry(body, headers)
+    backend.set(key, entry)
+    return entry
+
+
+def stats():
+    lookups = hits + misses
+    return {
+        "backend": BACKEND,
+        "ttl": TTL,
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / lookups if lookups else 0.0,
+    }
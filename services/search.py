@@ -0,0 +1,194 @@
+import math
+import os
+import threading
+import time
+from collections import Counter
+from dotenv import load_dotenv
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from database import models
+from database.database import SessionLocal
+from services import response_cache
+from services.text import normalize, tokenize
+
+# in-process inverted index over pattern and response texts, ranked with BM25.
+# It is built from the database on first use and kept in sync by the intent writes of
+# this process. Every intent write bumps the response cache's "intents" version, which the
+# SQLite backend shares between the workers of a host; a worker rebuilds its index when
+# that version moved past its own writes. SEARCH_INDEX_MAX_AGE additionally bounds the age
+# of the index where versions aren't shared (0, the default, never rebuilds on age alone).
+
+load_dotenv()
+MAX_AGE = float(os.getenv("SEARCH_INDEX_MAX_AGE", "0"))
+VERSION_RESOURCE = "intents"
+
+KINDS = ("pattern", "response")
+K1 = 1.2
+B = 0.75
+
+
+class SearchIndex:
+    def __init__(self, max_age: float = 0):
+        self.max_age = max_age
+        self._lock = threading.RLock()
+        self._loaded_at = None
+        self._version = None
+        self._clear()
+
+    def _clear(self):
+        # (kind, row id) -> (intent_id, text, {token: frequency}, length)
+        self._docs = {}
+        # token -> {(kind, row id): frequency}
+        self._postings = {}
+        # intent id -> {(kind, row id)}
+        self._intent_docs = {}
+        self._total_length = 0
+
+    def _add(self, kind: str, row_id: int, intent_id: int, text: str):
+        key = (kind, row_id)
+        frequencies = Counter(tokenize(text))
+        length = sum(frequencies.values())
+        self._docs[key] = (intent_id, text, frequencies, length)
+        self._intent_docs.setdefault(intent_id, set()).add(key)
+        self._total_length += length
+        for token, frequency in frequencies.items():
+            self._postings.setdefault(token, {})[key] = frequency
+
+    def _remove_intent(self, intent_id: int):
+        for key in self._intent_docs.pop(intent_id, ()):
+            _, _, frequencies, length = self._docs.pop(key)
+            self._total_length -= length
+            for token in frequencies:
+                postings = self._postings[token]
+                del postings[key]
+                if not postings:
+                    del self._postings[token]
+
+    # rows of (kind, row id, intent id, text) for the given intents, or for all of them
+    @staticmethod
+    def _rows(db: Session, intent_ids=None):
+        for kind, model in zip(KINDS, (models.Pattern, models.Response)):
+            statement = select(model.id, model.intent_id, model.text)
+            if intent_ids is not None:
+                statement = statement.where(model.intent_id.in_(intent_ids))
+            for row_id, intent_id, text in db.execute(statement):
+                yield kind, row_id, intent_id, text or ""
+
+    def _ensure_loaded(self):
+        # read before the rows, so a write landing mid-build triggers another rebuild
+        version = response_cache.backend.get_version(VERSION_RESOURCE)
+        if self._loaded_at is not None and version == self._version and (
+                not self.max_age or time.monotonic() - self._loaded_at < self.max_age):
+            return
+        self._clear()
+        # from the primary: a replica may not have the writes behind the version yet
+        with SessionLocal() as primary:
+            for row in self._rows(primary):
+                self._add(*row)
+        self._loaded_at = time.monotonic()
+        self._version = version
+
+    # re-read one intent's patterns and responses after a write; a deleted intent drops out.
+    # Called after the write bumped the version: a single bump is this write, already
+    # applied here, while any other means another worker wrote too
+    def sync_intent(self, db: Session, intent_id: int):
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            self._remove_intent(intent_id)
+            for row in self._rows(db, [intent_id]):
+                self._add(*row)
+            version = response_cache.backend.get_version(VERSION_RESOURCE)
+            if version == self._version + 1:
+                self._version = version
+
+    # rebuild from the database on next use (after bulk writes)
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+    # [(score, kind, row id, intent id, text)] best first, optionally limited to some intents
+    def search(self, query: str, intent_ids=None, kinds=KINDS, limit: int = 20):
+        with self._lock:
+            self._ensure_loaded()
+            count = len(self._docs)
+            if not count:
+                return []
+            average_length = self._total_length / count
+
+            scores = Counter()
+            for token in set(tokenize(query)):
+                postings = self._postings.get(token)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for key, frequency in postings.items():
+                    length = self._docs[key][3]
+                    scores[key] += idf * frequency * (K1 + 1) / (
+                        frequency + K1 * (1 - B + B * length / average_length))
+
+            hits = []
+            for key, score in scores.items():
+                intent_id, text, _, _ = self._docs[key]
+                if key[0] not in kinds or (intent_ids is not None and intent_id not in intent_ids):
+                    continue
+                hits.append((score, key[0], key[1], intent_id, text))
+            hits.sort(key=lambda hit: (-hit[0], hit[3], hit[2]))
+            return hits[:limit]
+
+    # {normalized text: sorted intent ids} for pattern texts shared by more than one intent
+    def duplicate_patterns(self, intent_ids=None):
+        with self._lock:
+            self._ensure_loaded()
+            owners = {}
+            for (kind, _), (intent_id, text, _, _) in self._docs.items():
+                if kind != "pattern" or (intent_ids is not None and intent_id not in intent_ids):
+                    continue
+                folded = normalize(text)
+                if folded:
+                    owners.setdefault(folded, set()).add(intent_id)
+            return {text: sorted(ids) for text, ids in owners.items() if len(ids) > 1}
+
+
+index = SearchIndex(MAX_AGE)
+
+
+# the intent ids a search is limited to: an NPC's intents, a project's NPCs' intents, or None for all
+def get_scope(db: Session, npc_id: int = None, project_id: int = None):
+    if npc_id is not None:
+        statement = select(models.NPCIntent.c.intent_id).where(models.NPCIntent.c.npc_id == npc_id)
+    elif project_id is not None:
+        statement = select(models.NPCIntent.c.intent_id).join(
+            models.ProjectNPC, models.ProjectNPC.c.npc_id == models.NPCIntent.c.npc_id).where(
+            models.ProjectNPC.c.project_id == project_id)
+    else:
+        return None
+    return set(db.execute(statement).scalars())
+
+
+def get_tags(db: Session, intent_ids):
+    if not intent_ids:
+        return {}
+    return dict(db.execute(select(models.Intent.id, models.Intent.tag).where(
+        models.Intent.id.in_(set(intent_ids)))).all())
+
+
+def search(db: Session, query: str, npc_id: int = None, project_id: int = None,
+           kind: str = None, limit: int = 20):
+    hits = index.search(query, get_scope(db, npc_id, project_id),
+                        (kind,) if kind else KINDS, limit)
+    tags = get_tags(db, [intent_id for _, _, _, intent_id, _ in hits])
+    return [{"intent_id": intent_id, "tag": tags.get(intent_id), "kind": hit_kind, "id": row_id,
+             "text": text, "score": round(score, 4)}
+            for score, hit_kind, row_id, intent_id, text in hits]
+
+
+# pattern texts (after case and punctuation folding) claimed by several intents
+def duplicates(db: Session, npc_id: int = None, project_id: int = None):
+    owners = index.duplicate_patterns(get_scope(db, npc_id, project_id))
+    tags = get_tags(db, [intent_id for ids in owners.values() for intent_id in ids])
+    report = [{"text": text, "intents": [{"id": intent_id, "tag": tags.get(intent_id)}
+                                         for intent_id in ids]}
+              for text, ids in owners.items()]
+    report.sort(key=lambda duplicate: (-len(duplicate["intents"]), duplicate["text"]))
+    return report
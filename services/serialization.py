@@ -0,0 +1,142 @@
+import json
+import os
+from dotenv import load_dotenv
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from database import models
+
+# fast serialization path: read trees with column-only queries, one per level, build plain
+# dicts in the field order of the schemas and encode them directly, skipping ORM hydration
+# and orm_mode validation. "pydantic" mode keeps the response_model path.
+
+load_dotenv()
+MODE = os.getenv("SERIALIZATION_MODE", "fast")
+FAST = MODE == "fast"
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def encode(data):
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, allow_nan=False,
+                      separators=(",", ":")).encode("utf-8")
+
+
+def _in_order(ids, rows):
+    return [rows[row_id] for row_id in ids if row_id in rows]
+
+
+# {intent_id: schemas.Intent dict}
+def intent_dicts(db: Session, intent_ids):
+    intent_ids = set(intent_ids)
+    if not intent_ids:
+        return {}
+    intents = {}
+    for intent_id, tag in db.execute(select(models.Intent.id, models.Intent.tag).where(
+            models.Intent.id.in_(intent_ids))):
+        intents[intent_id] = {"tag": tag, "patterns": [], "responses": [], "id": intent_id}
+    for intent_id, text in db.execute(select(models.Pattern.intent_id, models.Pattern.text).where(
+            models.Pattern.intent_id.in_(intent_ids)).order_by(models.Pattern.id)):
+        intents[intent_id]["patterns"].append({"text": text})
+    for intent_id, text in db.execute(select(models.Response.intent_id, models.Response.text).where(
+            models.Response.intent_id.in_(intent_ids)).order_by(models.Response.id)):
+        intents[intent_id]["responses"].append({"text": text})
+    return intents
+
+
+# {npc_id: schemas.NPC dict}, intents in id order; intents shared by several NPCs are read once
+def npc_dicts(db: Session, npc_ids):
+    npc_ids = set(npc_ids)
+    if not npc_ids:
+        return {}
+    links = db.execute(select(models.NPCIntent.c.npc_id, models.NPCIntent.c.intent_id).where(
+        models.NPCIntent.c.npc_id.in_(npc_ids)).distinct().order_by(
+        models.NPCIntent.c.npc_id, models.NPCIntent.c.intent_id)).all()
+    intents = intent_dicts(db, [intent_id for _, intent_id in links])
+
+    npcs = {}
+    for npc_id, name, avatar, bio, voice, style, classifier in db.execute(select(
+            models.NPC.id, models.NPC.name, models.NPC.avatar, models.NPC.bio,
+            models.NPC.voice, models.NPC.style, models.NPC.classifier).where(
+            models.NPC.id.in_(npc_ids))):
+        npcs[npc_id] = {"name": name, "avatar": avatar, "bio": bio, "voice": voice,
+                        "style": style, "classifier": classifier, "intents": [], "id": npc_id}
+    for npc_id, intent_id in links:
+        if npc_id in npcs and intent_id in intents:
+            npcs[npc_id]["intents"].append(intents[intent_id])
+    return npcs
+
+
+# {project_id: schemas.Project dict}, NPCs in id order
+def project_dicts(db: Session, project_ids):
+    project_ids = set(project_ids)
+    if not project_ids:
+        return {}
+    links = db.execute(select(models.ProjectNPC.c.project_id, models.ProjectNPC.c.npc_id).where(
+        models.ProjectNPC.c.project_id.in_(project_ids)).distinct().order_by(
+        models.ProjectNPC.c.project_id, models.ProjectNPC.c.npc_id)).all()
+    npcs = npc_dicts(db, [npc_id for _, npc_id in links])
+
+    projects = {}
+    for project_id, name, description, user_id in db.execute(select(
+            models.Project.id, models.Project.name, models.Project.description,
+            models.Project.user_id).where(models.Project.id.in_(project_ids))):
+        projects[project_id] = {"name": name, "description": description, "id": project_id,
+                                "user_id": user_id, "npcs": []}
+    for project_id, npc_id in links:
+        if project_id in projects and npc_id in npcs:
+            projects[project_id]["npcs"].append(npcs[npc_id])
+    return projects
+
+
+# {user_id: schemas.User dict}, projects in id order
+def user_dicts(db: Session, user_ids):
+    user_ids = set(user_ids)
+    if not user_ids:
+        return {}
+    users = {}
+    for user_id, email in db.execute(select(models.User.id, models.User.email).where(
+            models.User.id.in_(user_ids))):
+        users[user_id] = {"email": email, "id": user_id, "projects": []}
+    project_rows = db.execute(select(models.Project.user_id, models.Project.id).where(
+        models.Project.user_id.in_(user_ids)).order_by(models.Project.id)).all()
+    projects = project_dicts(db, [project_id for _, project_id in project_rows])
+    for user_id, project_id in project_rows:
+        users[user_id]["projects"].append(projects[project_id])
+    return users
+
+
+# ids of one page, ordered by id; after_id continues a keyset page
+def _page_ids(db: Session, model, skip: int, limit: int, after_id: int):
+    statement = select(model.id)
+    if after_id is not None:
+        statement = statement.where(model.id > after_id)
+    return db.execute(statement.order_by(model.id).offset(skip).limit(limit)).scalars().all()
+
+
+def get_users(db: Session, skip: int = 0, limit: int = 100, after_id: int = None):
+    ids = _page_ids(db, models.User, skip, limit, after_id)
+    return _in_order(ids, user_dicts(db, ids))
+
+
+def get_user(db: Session, user_id: int):
+    return user_dicts(db, [user_id]).get(user_id)
+
+
+def get_projects(db: Session, skip: int = 0, limit: int = 100, after_id: int = None):
+    ids = _page_ids(db, models.Project, skip, limit, after_id)
+    return _in_order(ids, project_dicts(db, ids))
+
+
+def get_intents(db: Session, skip: int = 0, limit: int = 100, after_id: int = None):
+    ids = _page_ids(db, models.Intent, skip, limit, after_id)
+    return _in_order(ids, intent_dicts(db, ids))
+
+
+def get_npcs(db: Session, skip: int = 0, limit: int = 100, after_id: int = None):
+    ids = _page_ids(db, models.NPC, skip, limit, after_id)
+    return _in_order(ids, npc_dicts(db, ids))
@@ -0,0 +1,110 @@
+import hashlib
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from database import models
+from database.database import SessionLocal
+from services import serialization
+
+# materialized NPC snapshots: the bodies of /npcs/{id}/ and /npcs/intents/{id}/, serialized
+# when the NPC or one of its intents changes so a read is a single primary key lookup
+
+REBUILD_BATCH = 500
+
+
+def etag(body: bytes):
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+# serialize the given NPCs from plain column rows; returns {npc_id: (npc_body, intents_body)}
+def build(db: Session, npc_ids):
+    bodies = {}
+    for npc_id, npc in serialization.npc_dicts(db, npc_ids).items():
+        intents = [{
+            "id": intent["id"],
+            "tag": intent["tag"],
+            "patterns": [pattern["text"] for pattern in intent["patterns"]],
+            "responses": [response["text"] for response in intent["responses"]],
+        } for intent in npc["intents"]]
+        bodies[npc_id] = (serialization.encode(npc), serialization.encode(intents))
+    return bodies
+
+
+# rebuild the snapshots of the given NPCs inside the caller's transaction, so they
+# are committed together with the change that made them stale
+def refresh(db: Session, npc_ids):
+    npc_ids = set(npc_ids)
+    if not npc_ids:
+        return
+    db.flush()
+
+    existing = {snapshot.npc_id: snapshot for snapshot in db.query(models.NPCSnapshot).filter(
+        models.NPCSnapshot.npc_id.in_(npc_ids))}
+    for npc_id, (npc_body, intents_body) in build(db, npc_ids).items():
+        snapshot = existing.get(npc_id)
+        if snapshot is None:
+            snapshot = models.NPCSnapshot(npc_id=npc_id)
+            db.add(snapshot)
+        snapshot.npc_body = npc_body
+        snapshot.npc_etag = etag(npc_body)
+        snapshot.intents_body = intents_body
+        snapshot.intents_etag = etag(intents_body)
+
+
+def _read(db: Session, npc_id: int, *columns):
+    statement = select(*columns).where(models.NPCSnapshot.npc_id == npc_id)
+    row = db.execute(statement).first()
+    if row is not None:
+        return row
+    # an unknown NPC is a plain miss, not a write
+    if db.execute(select(models.NPC.id).where(models.NPC.id == npc_id)).first() is None:
+        return None
+    # migration 0004 snapshots every NPC; one missing here was stored by an older version
+    # of the API since, so materialize it on the primary
+    with SessionLocal() as write_db:
+        refresh(write_db, [npc_id])
+        try:
+            write_db.commit()
+        except IntegrityError:
+            # a concurrent first read of the same NPC stored it first
+            write_db.rollback()
+        return write_db.execute(statement).first()
+
+
+# (body, etag) of the NPC's /npcs/{id}/ response, or None when the NPC doesn't exist
+def get_npc(db: Session, npc_id: int):
+    return _read(db, npc_id, models.NPCSnapshot.npc_body, models.NPCSnapshot.npc_etag)
+
+
+# (body, etag) of the NPC's /npcs/intents/{id}/ response, or None when the NPC doesn't exist
+def get_intents(db: Session, npc_id: int):
+    return _read(db, npc_id, models.NPCSnapshot.intents_body, models.NPCSnapshot.intents_etag)
+
+
+# the etag of the NPC's response alone: changes whenever anything about the NPC does
+def get_npc_etag(db: Session, npc_id: int):
+    row = _read(db, npc_id, models.NPCSnapshot.npc_etag)
+    return row[0] if row else None
+
+
+# the etag of its intents alone: changes whenever the NPC's intents, patterns or responses do
+def get_intents_etag(db: Session, npc_id: int):
+    row = _read(db, npc_id, models.NPCSnapshot.intents_etag)
+    return row[0] if row else None
+
+
+def rebuild_all(db: Session):
+    npc_ids = db.execute(select(models.NPC.id).order_by(models.NPC.id)).scalars().all()
+    for start in range(0, len(npc_ids), REBUILD_BATCH):
+        refresh(db, npc_ids[start:start + REBUILD_BATCH])
+        db.commit()
+    return len(npc_ids)
+
+
+# command line: python -m services.snapshots (re)builds every NPC's snapshot
+if __name__ == "__main__":
+    db = SessionLocal()
+    try:
+        print(f"Rebuilt {rebuild_all(db)} NPC snapshots")
+    finally:
+        db.close()
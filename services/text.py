@@ -0,0 +1,15 @@
+import re
+import unicodedata
+
+# text folding shared by search and pattern matching: Unicode-normalized, case-folded
+# word tokens, so "Hello, World!" and "hello world" compare equal
+
+WORD = re.compile(r"\w+")
+
+
+def tokenize(text: str):
+    return WORD.findall(unicodedata.normalize("NFKC", text).casefold())
+
+
+def normalize(text: str):
+    return " ".join(tokenize(text))
@@ -0,0 +1,306 @@
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dotenv import load_dotenv
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from database import models
+from database.database import SessionLocal
+from services import model_cache
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# background chatbot training jobs, run in a process pool outside the request path.
+#
+# Jobs are rows of training_jobs, so every worker sees them and an NPC has at most one
+# job in flight whichever worker submitted it. ChatBot keeps its model files relative to
+# the working directory: a job trains in a directory of its own under CHATBOT_MODEL_DIR,
+# named after the corpus fingerprint, and the finished model is moved into the working
+# directory in one step under the NPC's model lock, which model loads share. A load never
+# reads a half-written model, and a cancelled job's model is simply deleted.
+
+load_dotenv()
+MAX_JOBS = int(os.getenv("TRAINING_MAX_JOBS", "2"))
+MODEL_DIR = os.path.abspath(os.getenv("CHATBOT_MODEL_DIR", ".models/chatbot"))
+# seconds after which a job still in flight is taken for abandoned (its worker died)
+JOB_TIMEOUT = float(os.getenv("TRAINING_JOB_TIMEOUT", "3600"))
+KEEP_FINISHED_JOBS = 100
+WAIT_INTERVAL = 0.5
+# where ChatBot loads models from
+LIVE_DIR = os.getcwd()
+ACTIVE_STATES = ("queued", "running")
+
+
+class TrainingFailed(Exception):
+    pass
+
+
+# a job as the API reports it, read from its row
+class Job:
+    def __init__(self, row, last_duration: float = None):
+        self.id = row.id
+        self.npc_id = row.npc_id
+        self.fingerprint = row.fingerprint
+        self.status = row.state
+        self.error = row.error
+        self.created_at = row.created_at
+        self.started_at = row.started_at
+        self.finished_at = row.finished_at
+        self._last_duration = last_duration
+
+    @property
+    def finished(self):
+        return self.status not in ACTIVE_STATES
+
+    # ChatBot training doesn't report progress, so estimate it from the NPC's last run
+    @property
+    def progress(self):
+        if self.status == "succeeded":
+            return 1.0
+        if self.status != "running" or not self._last_duration or not self.started_at:
+            return 0.0
+        return min((time.time() - self.started_at) / self._last_duration, 0.99)
+
+
+_executor = None
+# futures and completion events of the jobs this process submitted
+_futures = {}
+_done = {}
+_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=MAX_JOBS, mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+
+def _job_directory(job_id: str, npc_id: int, fingerprint: str):
+    # fingerprints are ETags, quotes included
+    fingerprint = fingerprint.strip('"')
+    return os.path.join(MODEL_DIR, f"{npc_id}-{fingerprint}-{job_id}")
+
+
+# hold the NPC's model lock: shared while loading its model, exclusive while replacing it.
+# A lock file serializes the workers of a host, where fcntl exists
+@contextmanager
+def model_lock(npc_id: int, exclusive: bool = False):
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    with open(os.path.join(MODEL_DIR, f"{npc_id}.lock"), "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+# move every file ChatBot wrote under directory to the same place under LIVE_DIR
+def _install(directory: str):
+    for root, _, files in os.walk(directory):
+        target_root = os.path.join(LIVE_DIR, os.path.relpath(root, directory))
+        os.makedirs(target_root, exist_ok=True)
+        for name in files:
+            target = os.path.join(target_root, name)
+            scratch = f"{target}.tmp-{uuid.uuid4().hex}"
+            shutil.move(os.path.join(root, name), scratch)
+            os.replace(scratch, target)
+
+
+def _last_duration(db, npc_id: int):
+    row = db.execute(
+        select(models.TrainingJob.started_at, models.TrainingJob.finished_at).where(
+            models.TrainingJob.npc_id == npc_id, models.TrainingJob.state == "succeeded")
+        .order_by(models.TrainingJob.finished_at.desc()).limit(1)).first()
+    return row[1] - row[0] if row and row[0] and row[1] else None
+
+
+def _to_job(db, row):
+    return Job(row, _last_duration(db, row.npc_id) if row.state == "running" else None)
+
+
+# runs inside a worker process, in the job's own directory; None when the job was
+# cancelled before it started
+def _train(job_id: str, npc_id: int, directory: str):
+    from services import npcs
+    db = SessionLocal()
+    try:
+        started = db.execute(
+            update(models.TrainingJob)
+            .where(models.TrainingJob.id == job_id, models.TrainingJob.state == "queued")
+            .values(state="running", started_at=time.time())).rowcount
+        db.commit()
+    finally:
+        db.close()
+    if not started:
+        return None
+
+    os.makedirs(directory)
+    # the worker process runs one job at a time, so changing its directory is safe
+    cwd = os.getcwd()
+    os.chdir(directory)
+    try:
+        npcs.load_chatbot(npc_id, True)
+    finally:
+        os.chdir(cwd)
+    return time.time()
+
+
+# mark a job finished, unless it already is (cancelled)
+def _finish(db, job_id: str, state: str, error: str = None, finished_at: float = None):
+    return db.execute(
+        update(models.TrainingJob)
+        .where(models.TrainingJob.id == job_id, models.TrainingJob.state.in_(ACTIVE_STATES))
+        .values(state=state, error=error, finished_at=finished_at or time.time(),
+                active_npc_id=None)).rowcount
+
+
+def _on_done(job_id: str, npc_id: int, fingerprint: str, directory: str, future):
+    from services import npcs
+    db = SessionLocal()
+    try:
+        if future.cancelled():
+            _finish(db, job_id, "cancelled")
+        elif future.exception() is not None:
+            _finish(db, job_id, "failed", repr(future.exception()))
+        elif future.result() is not None:
+            # claim the job before installing its model; a cancel that got there first wins
+            if _finish(db, job_id, "succeeded", finished_at=future.result()):
+                with model_lock(npc_id, exclusive=True):
+                    _install(directory)
+                # commits the job together with the fingerprint
+                npcs.set_trained_fingerprint(db, npc_id, fingerprint)
+                # the next chat loads the new model; older versions are never asked for again
+                model_cache.models.invalidate(npc_id)
+        db.commit()
+    except Exception as error:
+        db.rollback()
+        _finish(db, job_id, "failed", repr(error))
+        db.commit()
+    finally:
+        db.close()
+        shutil.rmtree(directory, ignore_errors=True)
+        with _lock:
+            _futures.pop(job_id, None)
+            _done.pop(job_id).set()
+
+
+def _insert(db, npc_id: int, fingerprint: str):
+    row = models.TrainingJob(id=uuid.uuid4().hex, npc_id=npc_id, fingerprint=fingerprint,
+                             state="queued", active_npc_id=npc_id, created_at=time.time())
+    db.add(row)
+    db.commit()
+    return row
+
+
+def _prune(db):
+    kept = select(models.TrainingJob.id).order_by(
+        models.TrainingJob.created_at.desc()).limit(KEEP_FINISHED_JOBS)
+    db.execute(delete(models.TrainingJob).where(
+        models.TrainingJob.active_npc_id.is_(None), models.TrainingJob.id.not_in(kept)))
+    db.commit()
+
+
+# queue a training job; an NPC with a job in flight, submitted by any worker, gets that job back
+def submit(npc_id: int, fingerprint: str):
+    db = SessionLocal()
+    try:
+        active = db.execute(select(models.TrainingJob).where(
+            models.TrainingJob.active_npc_id == npc_id)).scalar_one_or_none()
+        if active is not None and time.time() - active.created_at < JOB_TIMEOUT:
+            return _to_job(db, active)
+        if active is not None:
+            _finish(db, active.id, "failed", "Abandoned: the worker running it stopped")
+            db.commit()
+
+        try:
+            row = _insert(db, npc_id, fingerprint)
+        except IntegrityError:
+            # another worker submitted one meanwhile
+            db.rollback()
+            return _to_job(db, db.execute(select(models.TrainingJob).where(
+                models.TrainingJob.active_npc_id == npc_id)).scalar_one())
+        job = _to_job(db, row)
+        _prune(db)
+    finally:
+        db.close()
+
+    directory = _job_directory(job.id, npc_id, fingerprint)
+    with _lock:
+        _done[job.id] = threading.Event()
+        future = _futures[job.id] = _get_executor().submit(_train, job.id, npc_id, directory)
+    future.add_done_callback(
+        lambda future: _on_done(job.id, npc_id, fingerprint, directory, future))
+    return job
+
+
+def get_job(job_id: str):
+    db = SessionLocal()
+    try:
+        row = db.get(models.TrainingJob, job_id)
+        return _to_job(db, row) if row else None
+    finally:
+        db.close()
+
+
+def get_jobs():
+    db = SessionLocal()
+    try:
+        rows = db.execute(select(models.TrainingJob).order_by(
+            models.TrainingJob.created_at.desc()).limit(KEEP_FINISHED_JOBS)).scalars().all()
+        return [_to_job(db, row) for row in reversed(rows)]
+    finally:
+        db.close()
+
+
+# cancel a job from any worker; a job that already started runs to completion but its
+# model is discarded
+def cancel(job: Job):
+    db = SessionLocal()
+    try:
+        _finish(db, job.id, "cancelled")
+        db.commit()
+    finally:
+        db.close()
+    with _lock:
+        future = _futures.get(job.id)
+    if future is not None:
+        future.cancel()
+    return get_job(job.id)
+
+
+# block until a job finishes, raising if it didn't produce a model; a job of another
+# worker is polled
+def wait(job: Job, timeout: float = None):
+    with _lock:
+        done = _done.get(job.id)
+    if done is not None:
+        done.wait(timeout)
+    else:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not job.finished and (deadline is None or time.monotonic() < deadline):
+            time.sleep(WAIT_INTERVAL)
+            job = get_job(job.id)
+    job = get_job(job.id)
+    if job.status != "succeeded":
+        raise TrainingFailed(job.error or f"Training job {job.id} {job.status}")
+    return job
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,168 @@
+import asyncio
+import io
+import os
+import threading
+import time
+from xml.sax.saxutils import escape, quoteattr
+import httpx
+from dotenv import load_dotenv
+from services import metrics, tts_cache
+
+# non-blocking Microsoft Azure Text-To-Speech client: pooled connections, audio streamed as it arrives
+
+load_dotenv()
+API_KEY = os.getenv("AZURE_API_KEY")
+TTS_URL = os.getenv(
+    "TTS_URL", "https://australiaeast.tts.speech.microsoft.com/cognitiveservices/v1")
+OUTPUT_FORMAT = "audio-24khz-160kbitrate-mono-mp3"
+MAX_CONNECTIONS = int(os.getenv("TTS_MAX_CONNECTIONS", "20"))
+SERVER_PLAYBACK = os.getenv("TTS_SERVER_PLAYBACK", "false").lower() in ("1", "true", "yes")
+PLAYBACK_DEDUP_SECONDS = float(os.getenv("TTS_PLAYBACK_DEDUP_SECONDS", "30"))
+CHUNK_SIZE = 8192
+
+
+class TTSError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+_client = None
+_client_loop = None
+
+
+# close a client created on another event loop: on that loop while it still runs,
+# otherwise here (its connections can't be reused, but their sockets are released)
+async def _close_stale_client(client: httpx.AsyncClient, loop):
+    if loop is not None and loop.is_running() and not loop.is_closed():
+        asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+        return
+    try:
+        await client.aclose()
+    except Exception:
+        pass
+
+
+# one pooled client per event loop, reused across requests
+async def get_client():
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client_loop is not loop:
+        stale_client, stale_loop = _client, _client_loop
+        _client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS,
+                                max_keepalive_connections=MAX_CONNECTIONS),
+            timeout=httpx.Timeout(10.0, read=30.0))
+        _client_loop = loop
+        if stale_client is not None:
+            await _close_stale_client(stale_client, stale_loop)
+    return _client
+
+
+async def close_client():
+    global _client, _client_loop
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+        _client_loop = None
+
+
+def build_ssml(voice_name: str, text: str, style: str):
+    return f"""<?xml version="1.0" encoding="utf-8"?>
+    <speak version="1.0" xmlns="http://www.w3.org/2001/10/synthesis" xmlns:mstts="https://www.w3.org/2001/mstts" xml:lang="en-GB">
+        <voice name={quoteattr(voice_name)}>
+            <mstts:express-as style={quoteattr(style)} styledegree="2">{escape(text)}</mstts:express-as>
+        </voice>
+    </speak>"""
+
+
+# when each line was last played, so a line prefetched by /chat/ and then fetched from
+# the cache by /chat/voice is played once
+_played = {}
+_played_lock = threading.Lock()
+
+
+# play audio on the server, off the request path (opt-in through TTS_SERVER_PLAYBACK);
+# a line already played in the last PLAYBACK_DEDUP_SECONDS is skipped
+def play_in_background(key: str, data: bytes):
+    now = time.monotonic()
+    with _played_lock:
+        for played_key in [k for k, played in _played.items() if now - played > PLAYBACK_DEDUP_SECONDS]:
+            del _played[played_key]
+        if key in _played:
+            return
+        _played[key] = now
+
+    def play_audio():
+        from pydub import AudioSegment
+        from pydub.playback import play
+        with metrics.stage("tts_playback"):
+            play(AudioSegment.from_file(io.BytesIO(data), format="mp3"))
+
+    threading.Thread(target=play_audio, daemon=True).start()
+
+
+async def _cached_chunks(key: str, data: bytes):
+    if SERVER_PLAYBACK:
+        play_in_background(key, data)
+    for start in range(0, len(data), CHUNK_SIZE):
+        yield data[start:start + CHUNK_SIZE]
+
+
+# relay upstream audio as it arrives, caching the full rendering once it completes
+async def _upstream_chunks(key: str, response: httpx.Response):
+    chunks = []
+    try:
+        async for chunk in response.aiter_bytes(CHUNK_SIZE):
+            chunks.append(chunk)
+            yield chunk
+    finally:
+        await response.aclose()
+
+    data = b"".join(chunks)
+    with metrics.stage("tts_cache_write"):
+        await asyncio.to_thread(tts_cache.audio.put, key, data)
+    if SERVER_PLAYBACK:
+        play_in_background(key, data)
+
+
+# start rendering a line; returns an async iterator of audio chunks
+async def stream_voice(voice_name: str, text: str, style: str):
+    key = tts_cache.cache_key(voice_name, style, text, OUTPUT_FORMAT)
+    with metrics.stage("tts_cache_lookup"):
+        data = await asyncio.to_thread(tts_cache.audio.get, key)
+    if data is not None:
+        return _cached_chunks(key, data)
+
+    headers = {
+        "Content-Type": "application/ssml+xml",
+        "Authorization": "Bearer [Base64 access_token]",
+        "X-Microsoft-OutputFormat": OUTPUT_FORMAT,
+        "Ocp-Apim-Subscription-Key": API_KEY or "",
+        "User-Agent": "NPC-Creator",
+    }
+    client = await get_client()
+    request = client.build_request(
+        "POST", TTS_URL, headers=headers, content=build_ssml(voice_name, text, style).encode())
+    try:
+        # until the response headers; the audio itself is streamed through to the client
+        with metrics.stage("tts_request"):
+            response = await client.send(request, stream=True)
+    except httpx.HTTPError as error:
+        raise TTSError(502, f"Text-to-speech service unreachable: {error}")
+
+    if response.is_error:
+        await response.aread()
+        await response.aclose()
+        raise TTSError(response.status_code, response.text)
+    return _upstream_chunks(key, response)
+
+
+# render a line into the cache without sending it anywhere
+async def prefetch(voice_name: str, text: str, style: str):
+    try:
+        async for _ in await stream_voice(voice_name, text, style):
+            pass
+    except (TTSError, httpx.HTTPError):
+        pass
@@ -0,0 +1,126 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+# content-addressed on-disk cache of rendered text-to-speech audio, LRU-evicted under a byte budget
+
+load_dotenv()
+CACHE_DIR = os.getenv("TTS_CACHE_DIR", ".tts_cache")
+MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+SUFFIX = ".audio"
+
+
+def cache_key(voice_name: str, style: str, text: str, output_format: str):
+    return hashlib.sha256(
+        json.dumps([voice_name, style, text, output_format]).encode()).hexdigest()
+
+
+class AudioCache:
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._index = None
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _path(self, key: str):
+        return os.path.join(self.directory, key + SUFFIX)
+
+    # build the LRU index from the files already on disk, oldest access first
+    def _load_index(self):
+        if self._index is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(SUFFIX):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name[:-len(SUFFIX)], stat.st_size))
+        self._index = OrderedDict(
+            (key, size) for _, key, size in sorted(entries))
+        self._bytes = sum(self._index.values())
+
+    # the cached audio, or None on a miss (a file evicted by another thread or worker
+    # is a miss). It is opened under the lock; a later eviction only unlinks it, so the
+    # open handle still reads the whole file
+    def get(self, key: str):
+        path = self._path(key)
+        with self._lock:
+            self._load_index()
+            try:
+                f = open(path, "rb")
+            except FileNotFoundError:
+                # evicted by another worker sharing the directory
+                if key in self._index:
+                    self._bytes -= self._index.pop(key)
+                self.misses += 1
+                return None
+            try:
+                # touching the file keeps the LRU order across restarts
+                os.utime(path)
+            except FileNotFoundError:
+                pass
+            if key not in self._index:
+                self._index[key] = os.fstat(f.fileno()).st_size
+                self._bytes += self._index[key]
+            self._index.move_to_end(key)
+            self.hits += 1
+        with f:
+            return f.read()
+
+    # write the audio atomically so readers never see a partial file
+    def put(self, key: str, data: bytes):
+        path = self._path(key)
+        with self._lock:
+            self._load_index()
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+        with self._lock:
+            if key in self._index:
+                self._bytes -= self._index.pop(key)
+            self._index[key] = len(data)
+            self._bytes += len(data)
+            self._evict()
+        return path
+
+    def stats(self):
+        with self._lock:
+            self._load_index()
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._index),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    # remove least recently used files, always keeping the newest one
+    def _evict(self):
+        while len(self._index) > 1 and self._bytes > self.max_bytes:
+            key, size = self._index.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+
+audio = AudioCache(CACHE_DIR, MAX_BYTES)
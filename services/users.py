@@ -1,20 +1,29 @@
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from database import models
 import schemas
+from services.loading import USER_TREE
 
 # object-relational-mapping (ORM) crud operations (performs SQL under the hood)
 
 
 def get_user(db: Session, user_id: int):
-    return db.query(models.User).filter(models.User.id == user_id).first()
+    return db.query(models.User).options(*USER_TREE).filter(models.User.id == user_id).first()
 
 
 def get_user_by_email(db: Session, email: str):
     return db.query(models.User).filter(models.User.email == email).first()
 
 
-def get_users(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.User).offset(skip).limit(limit).all()
+def get_users(db: Session, skip: int = 0, limit: int = 100, after_id: int = None):
+    query = db.query(models.User).options(*USER_TREE)
+    if after_id is not None:
+        query = query.filter(models.User.id > after_id)
+    return query.order_by(models.User.id).offset(skip).limit(limit).all()
+
+
+def count_users(db: Session):
+    return db.query(func.count(models.User.id)).scalar()
 
 
 def create_user(db: Session, user: schemas.UserCreate):
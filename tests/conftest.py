@@ -0,0 +1,67 @@
+import os
+import sys
+import tempfile
+
+# the tests import the app from the repository root and run it against a scratch
+# SQLite database; settings are read when the modules are imported, so set them first
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_directory = tempfile.mkdtemp(prefix="npc-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_directory, 'test.db')}"
+os.environ.pop("DATABASE_REPLICA_URL", None)
+os.environ["RESPONSE_CACHE_BACKEND"] = "none"
+os.environ["TFIDF_MODEL_DIR"] = ""
+os.environ["CHATBOT_MODEL_DIR"] = os.path.join(_directory, "chatbot")
+os.environ["TTS_CACHE_DIR"] = os.path.join(_directory, "tts_cache")
+os.environ["PRELOAD_NPCS"] = "0"
+# /chat/ prefetches the reply's audio; fail fast instead of calling Azure
+os.environ["TTS_URL"] = "http://127.0.0.1:9/"
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+
+import endpoints
+from benchmarks import seed
+from database import models
+from database.database import SessionLocal, engine
+from services import npcs, serialization, snapshots
+
+SCALE = "small"
+# NPC 1 gets BIG_NPC_INTENTS intents, every other NPC keeps the scale's (10)
+BIG_NPC_INTENTS = 300
+
+
+class StubClassifier:
+    def get_response(self, sentence: str):
+        return "stub reply"
+
+
+# the app against a database seeded at SCALE, whose NPCs answer with StubClassifier
+@pytest.fixture(scope="session")
+def client():
+    models.Base.metadata.create_all(bind=engine)
+    seed.seed_scale(engine, SCALE, classifier="stub")
+    _, _, _, intents, _ = seed.SCALES[SCALE]
+    with engine.begin() as connection:
+        connection.execute(insert(models.NPCIntent), [
+            {"npc_id": 1, "intent_id": intent_id}
+            for intent_id in range(intents + 1, BIG_NPC_INTENTS + 1)])
+    db = SessionLocal()
+    try:
+        snapshots.rebuild_all(db)
+    finally:
+        db.close()
+
+    npcs.CLASSIFIERS["stub"] = lambda db, npc_id: StubClassifier()
+    with TestClient(endpoints.app) as test_client:
+        yield test_client
+    del npcs.CLASSIFIERS["stub"]
+
+
+# run a test with each serialization mode
+@pytest.fixture(params=["fast", "pydantic"])
+def serialization_mode(request, monkeypatch):
+    monkeypatch.setattr(serialization, "FAST", request.param == "fast")
+    return request.param
@@ -0,0 +1,17 @@
+import pytest
+
+# the /async/ endpoints run the sync ones on the async session: same bodies, same headers
+
+PATHS = ["/users/", "/users/1", "/projects/", "/intents/", "/npcs/", "/npcs/1/", "/npcs/intents/1/"]
+HEADERS = ("etag", "x-next-cursor", "x-total-count")
+
+
+@pytest.mark.parametrize("path", PATHS)
+def test_async_endpoints_answer_like_sync_ones(client, serialization_mode, path):
+    params = {"limit": 3, "include_total": True} if path.endswith("s/") else {}
+    sync = client.get(path, params=params)
+    asynchronous = client.get(f"/async{path}", params=params)
+    assert sync.status_code == asynchronous.status_code == 200
+    assert asynchronous.content == sync.content
+    for header in HEADERS:
+        assert asynchronous.headers.get(header) == sync.headers.get(header)
@@ -0,0 +1,37 @@
+from services import npcs, training
+
+
+def failing_classifier(db, npc_id):
+    raise training.TrainingFailed("Training the NPC's model failed: out of memory")
+
+
+# a session whose NPC can't be trained reports it, like /chat/'s 503, instead of dropping
+def test_session_reports_failed_training(client, monkeypatch):
+    monkeypatch.setitem(npcs.CLASSIFIERS, "stub", failing_classifier)
+    with client.websocket_connect("/chat/ws/2?audio=false") as websocket:
+        message = websocket.receive_json()
+        assert message["type"] == "error"
+        assert "out of memory" in message["detail"]
+        closed = websocket.receive()
+    assert closed["type"] == "websocket.close"
+    assert closed["code"] == 1011
+
+
+def test_session_replies(client):
+    with client.websocket_connect("/chat/ws/2?audio=false") as websocket:
+        websocket.send_text("no such pattern")
+        assert websocket.receive_json() == {
+            "type": "text", "sentence": "no such pattern", "response": "stub reply"}
+
+
+# a body without a sentence is rejected before any lookup, not a 500 from the classifier
+def test_chat_without_sentence_is_rejected(client):
+    response = client.post("/chat/", json={"npc_id": 2})
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"] == ["body", "sentence"]
+
+
+def test_chat_replies(client):
+    response = client.post("/chat/", json={"npc_id": 2, "sentence": "no such pattern"})
+    assert response.status_code == 200
+    assert response.json() == "stub reply"
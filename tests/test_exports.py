@@ -0,0 +1,33 @@
+import json
+
+from sqlalchemy import delete, insert
+
+from database import models
+from database.database import engine
+
+NPC_ID = 4
+# below every seeded intent id, and with no intent row
+ORPHAN_INTENT_ID = 0
+
+
+# a pattern and a response whose intent is gone sort before every real intent; the
+# export merge must skip them rather than stall and drop the texts of every later intent
+def test_export_skips_texts_of_missing_intents(client):
+    expected = client.get(f"/npcs/intents/{NPC_ID}/").json()
+    with engine.begin() as connection:
+        connection.execute(insert(models.NPCIntent).values(npc_id=NPC_ID, intent_id=ORPHAN_INTENT_ID))
+        connection.execute(insert(models.Pattern).values(text="orphan", intent_id=ORPHAN_INTENT_ID))
+        connection.execute(insert(models.Response).values(text="orphan", intent_id=ORPHAN_INTENT_ID))
+    try:
+        response = client.get(f"/npcs/{NPC_ID}/export")
+        assert response.status_code == 200
+        exported = [json.loads(line) for line in response.text.splitlines()]
+    finally:
+        with engine.begin() as connection:
+            connection.execute(delete(models.NPCIntent).where(
+                models.NPCIntent.c.intent_id == ORPHAN_INTENT_ID))
+            connection.execute(delete(models.Pattern).where(models.Pattern.intent_id == ORPHAN_INTENT_ID))
+            connection.execute(delete(models.Response).where(models.Response.intent_id == ORPHAN_INTENT_ID))
+
+    assert exported == expected
+    assert all(intent["patterns"] and intent["responses"] for intent in exported)
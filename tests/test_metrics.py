@@ -0,0 +1,45 @@
+import time
+
+from fastapi import BackgroundTasks, FastAPI
+from fastapi.testclient import TestClient
+
+from services import metrics
+
+TASK_SECONDS = 0.2
+
+
+def slow_task():
+    with metrics.stage("slow_task"):
+        time.sleep(TASK_SECONDS)
+
+
+app = FastAPI()
+app.add_middleware(metrics.MetricsMiddleware)
+
+
+@app.get("/work")
+def work(background_tasks: BackgroundTasks):
+    with metrics.stage("handler"):
+        pass
+    background_tasks.add_task(slow_task)
+    return {"ok": True}
+
+
+def series(histogram, labels):
+    # [bucket counts, sum, count]
+    return histogram._series.get(labels, [[], 0.0, 0])
+
+
+# a background task runs after the response: it is neither part of the request's latency
+# nor one of its stages
+def test_background_tasks_are_recorded_apart_from_the_request():
+    before = series(metrics.stages, (metrics.BACKGROUND, "slow_task"))[2]
+    with TestClient(app) as client:
+        assert client.get("/work").status_code == 200
+
+    _, seconds, count = series(metrics.requests, ("GET", "/work", "200"))
+    assert count == 1
+    assert seconds < TASK_SECONDS
+    assert series(metrics.stages, ("/work", "handler"))[2] == 1
+    assert series(metrics.stages, ("/work", "slow_task"))[2] == 0
+    assert series(metrics.stages, (metrics.BACKGROUND, "slow_task"))[2] == before + 1
@@ -0,0 +1,92 @@
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# SQL statements per request of the read endpoints, against the seeded database of
+# conftest.py. A list page of two rows must cost what a page of one does, and a detail
+# response the same whatever the size of its tree; a lazy load per row (N+1) breaks
+# both. The budgets catch any other new query.
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.statements = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+        self.statements.append(statement)
+
+
+def record_queries(client, method: str, path: str, **options):
+    counter = QueryCounter()
+    event.listen(Engine, "before_cursor_execute", counter)
+    try:
+        response = client.request(method, path, **options)
+    finally:
+        event.remove(Engine, "before_cursor_execute", counter)
+    assert response.status_code == 200, response.text
+    return counter
+
+
+def count_queries(client, method: str, path: str, **options):
+    return record_queries(client, method, path, **options).count
+
+
+# path, most statements for a page of 50. Selectin loads fetch at most 500 parents per
+# IN query, so a deep tree takes a few more statements on a big page, never one per row
+LIST_ENDPOINTS = [
+    ("/", 1),
+    ("/users/", 14),
+    ("/projects/", 13),
+    ("/intents/", 4),
+    ("/npcs/", 6),
+    ("/async/users/", 14),
+    ("/async/projects/", 13),
+    ("/async/intents/", 4),
+    ("/async/npcs/", 6),
+]
+
+
+@pytest.mark.parametrize("path, budget", LIST_ENDPOINTS)
+def test_list_queries_dont_grow_with_page_size(client, serialization_mode, path, budget):
+    one = count_queries(client, "GET", path, params={"limit": 1})
+    two = count_queries(client, "GET", path, params={"limit": 2})
+    assert one == two
+    assert count_queries(client, "GET", path, params={"limit": 50}) <= budget
+
+
+# path of the big NPC's (or its owner's) resource, of a small one, most statements
+DETAIL_ENDPOINTS = [
+    ("/users/1", "/users/2", 9),
+    ("/npcs/1/", "/npcs/2/", 1),
+    ("/npcs/intents/1/", "/npcs/intents/2/", 1),
+    ("/npcs/1/export", "/npcs/2/export", 4),
+    # three streamed cursors per NPC of the project (5 in both)
+    ("/projects/1/export", "/projects/2/export", 17),
+    ("/async/npcs/1/", "/async/npcs/2/", 1),
+    ("/async/npcs/intents/1/", "/async/npcs/intents/2/", 1),
+]
+
+
+@pytest.mark.parametrize("big, small, budget", DETAIL_ENDPOINTS)
+def test_detail_queries_dont_grow_with_tree_size(client, serialization_mode, big, small, budget):
+    big_count = count_queries(client, "GET", big)
+    small_count = count_queries(client, "GET", small)
+    assert big_count == small_count
+    assert big_count <= budget
+
+
+# the chat path looks the NPC up without loading its intents; an eager join would keep the
+# statement count and fetch one row per intent instead
+def test_chat_queries_dont_load_the_corpus(client):
+    for npc_id in (1, 2):
+        # first message of each NPC builds its pattern index
+        count_queries(client, "POST", "/chat/", json={"npc_id": npc_id, "sentence": "warm up"})
+    big = record_queries(client, "POST", "/chat/", json={"npc_id": 1, "sentence": "no such pattern"})
+    small = record_queries(client, "POST", "/chat/", json={"npc_id": 2, "sentence": "no such pattern"})
+    assert big.count == small.count
+    assert big.count <= 3
+    for statement in big.statements:
+        assert "npc_intents" not in statement
+        assert "FROM intents" not in statement
@@ -0,0 +1,46 @@
+import pytest
+
+from database.database import SessionLocal
+from services import response_cache, search
+
+
+class CountingIndex(search.SearchIndex):
+    def __init__(self):
+        super().__init__()
+        self.rebuilds = 0
+
+    def _rows(self, db, intent_ids=None):
+        if intent_ids is None:
+            self.rebuilds += 1
+        return super()._rows(db, intent_ids)
+
+
+@pytest.fixture
+def index(client, monkeypatch):
+    monkeypatch.setattr(response_cache, "backend", response_cache.MemoryBackend(10))
+    return CountingIndex()
+
+
+def test_index_is_reused_until_the_corpus_changes(index):
+    index.search("castle")
+    index.search("castle")
+    assert index.rebuilds == 1
+
+    # another worker's intent write
+    response_cache.invalidate("intents")
+    index.search("castle")
+    assert index.rebuilds == 2
+
+
+def test_own_writes_are_synced_without_a_rebuild(index):
+    index.search("castle")
+    response_cache.invalidate("intents")
+    with SessionLocal() as db:
+        index.sync_intent(db, 1)
+    index.search("castle")
+    assert index.rebuilds == 1
+
+
+@pytest.mark.parametrize("limit, status", [(0, 422), (100, 200), (101, 422)])
+def test_search_limit_is_bounded(client, limit, status):
+    assert client.get("/search", params={"q": "castle", "limit": limit}).status_code == status
@@ -0,0 +1,63 @@
+import os
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, delete, text
+from sqlalchemy.orm import Session
+
+from conftest import ROOT
+from database import models
+from database.database import SessionLocal, engine
+from services import snapshots
+
+
+def drop_snapshot(npc_id: int):
+    with engine.begin() as connection:
+        connection.execute(delete(models.NPCSnapshot).where(models.NPCSnapshot.npc_id == npc_id))
+
+
+def no_write_session():
+    raise AssertionError("a read of an unknown NPC opened a write session")
+
+
+def test_unknown_npc_is_not_written(client, monkeypatch):
+    monkeypatch.setattr(snapshots, "SessionLocal", no_write_session)
+    with SessionLocal() as db:
+        assert snapshots.get_npc(db, 10 ** 6) is None
+    assert client.get(f"/npcs/{10 ** 6}/").status_code == 404
+
+
+def test_concurrent_first_reads_store_one_snapshot(client, monkeypatch):
+    drop_snapshot(3)
+    refresh = snapshots.refresh
+
+    # the other read commits the snapshot between this one's build and its commit
+    def racing_refresh(db, npc_ids):
+        refresh(db, npc_ids)
+        with SessionLocal() as other_db:
+            refresh(other_db, npc_ids)
+            other_db.commit()
+
+    monkeypatch.setattr(snapshots, "refresh", racing_refresh)
+    with SessionLocal() as db:
+        body, npc_etag = snapshots.get_npc(db, 3)
+    assert npc_etag == snapshots.etag(body)
+    assert client.get("/npcs/3/").headers["etag"] == npc_etag
+
+
+def test_migration_backfills_snapshots(tmp_path):
+    url = f"sqlite:///{tmp_path / 'migrated.db'}"
+    config = Config(os.path.join(ROOT, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(ROOT, "migrations"))
+    config.set_main_option("sqlalchemy.url", url)
+    command.upgrade(config, "0003")
+    migrated = create_engine(url)
+    with migrated.begin() as connection:
+        connection.execute(text("INSERT INTO npcs (id, name) VALUES (1, 'merchant')"))
+
+    command.upgrade(config, "0004")
+    with Session(migrated) as db:
+        snapshot = db.get(models.NPCSnapshot, 1)
+        assert snapshot is not None
+        assert snapshot.npc_etag == snapshots.etag(snapshot.npc_body)
+    migrated.dispose()
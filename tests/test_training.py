@@ -0,0 +1,75 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from database.database import SessionLocal
+from services import npcs, training
+
+NPC_ID = 7
+
+
+# training jobs run on a thread, with a chatbot that writes its model to the working
+# directory as ChatBot does, and the models installed under a scratch directory
+@pytest.fixture
+def trainer(client, monkeypatch, tmp_path):
+    release = threading.Event()
+    release.set()
+
+    def load_chatbot(npc_id, training_required):
+        assert training_required
+        release.wait(5)
+        os.makedirs("models")
+        with open(os.path.join("models", f"{npc_id}.bin"), "w") as f:
+            f.write("trained")
+
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(training, "_get_executor", lambda: executor)
+    monkeypatch.setattr(training, "LIVE_DIR", str(tmp_path))
+    monkeypatch.setattr(npcs, "load_chatbot", load_chatbot)
+    yield release
+    release.set()
+    executor.shutdown(wait=True)
+
+
+def trained_fingerprint():
+    with SessionLocal() as db:
+        return npcs.get_trained_fingerprint(db, NPC_ID)
+
+
+def test_model_is_installed_when_the_job_succeeds(trainer, tmp_path):
+    job = training.wait(training.submit(NPC_ID, '"v1"'), timeout=5)
+    assert job.status == "succeeded"
+    assert (tmp_path / "models" / f"{NPC_ID}.bin").read_text() == "trained"
+    assert trained_fingerprint() == '"v1"'
+    # the job's own directory is gone
+    assert not [name for name in os.listdir(training.MODEL_DIR) if not name.endswith(".lock")]
+
+
+# a second worker submitting the same NPC gets the job in flight, not a second one
+def test_jobs_are_deduplicated_across_workers(trainer, monkeypatch):
+    trainer.clear()
+    job = training.submit(NPC_ID, '"v2"')
+    # what another worker sees: the job's row, none of this process's futures
+    with monkeypatch.context() as other_worker:
+        other_worker.setattr(training, "_futures", {})
+        other_worker.setattr(training, "_done", {})
+        assert training.submit(NPC_ID, '"v2"').id == job.id
+        assert training.get_job(job.id).status in ("queued", "running")
+    trainer.set()
+    training.wait(job, timeout=5)
+
+
+def test_cancelled_running_job_discards_its_model(trainer, tmp_path):
+    trainer.clear()
+    before = trained_fingerprint()
+    job = training.submit(NPC_ID, '"v3"')
+    training.cancel(job)
+    trainer.set()
+    with pytest.raises(training.TrainingFailed):
+        training.wait(job, timeout=5)
+
+    assert training.get_job(job.id).status == "cancelled"
+    assert trained_fingerprint() == before
+    assert not (tmp_path / "models").exists()
@@ -0,0 +1,29 @@
+import pytest
+
+from benchmarks import fake_tts
+from services import tts
+
+NPC_ID = 5
+
+
+@pytest.fixture
+def tts_server(monkeypatch):
+    server = fake_tts.start(latency=0, audio_bytes=20000)
+    monkeypatch.setattr(tts, "TTS_URL", server.url)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+# /chat/ renders the reply's audio in the background; /chat/voice then serves that
+# rendering from the cache without asking the upstream service again
+def test_prefetched_reply_is_served_from_the_cache(client, tts_server):
+    npc = client.get(f"/npcs/{NPC_ID}/").json()
+    reply = client.post("/chat/", json={"npc_id": NPC_ID, "sentence": "no such pattern"}).json()
+    assert tts_server.requests == 1
+
+    response = client.post("/chat/voice", params={
+        "voice_name": npc["voice"], "text": reply, "style": npc["style"]})
+    assert response.status_code == 200
+    assert response.content == b"\xff" * 20000
+    assert tts_server.requests == 1
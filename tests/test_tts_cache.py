@@ -0,0 +1,32 @@
+import os
+
+from services import tts_cache
+
+AUDIO = b"ID3" + bytes(range(256)) * 64
+
+
+def test_file_removed_by_another_worker_is_a_miss(tmp_path):
+    cache = tts_cache.AudioCache(str(tmp_path), max_bytes=1024 * 1024)
+    path = cache.put("line", AUDIO)
+    os.remove(path)
+
+    assert cache.get("line") is None
+    stats = cache.stats()
+    assert (stats["entries"], stats["bytes"], stats["misses"]) == (0, 0, 1)
+
+
+# an eviction between opening the file and reading it unlinks it, the open handle still
+# reads the whole audio
+def test_file_evicted_during_a_read_is_still_served(tmp_path, monkeypatch):
+    cache = tts_cache.AudioCache(str(tmp_path), max_bytes=1024 * 1024)
+    path = cache.put("line", AUDIO)
+    utime = os.utime
+
+    def evict_then_touch(touched, *args, **kwargs):
+        os.remove(touched)
+        utime(touched, *args, **kwargs)
+
+    monkeypatch.setattr(tts_cache.os, "utime", evict_then_touch)
+    assert cache.get("line") == AUDIO
+    assert not os.path.exists(path)
+    assert cache.stats()["hits"] == 1